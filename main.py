@@ -13,14 +13,16 @@ def main():
 
     print("Orbitvu Support Site: 17219    Sun Site: 17606")
     site_id = input("Enter site ID: ").strip()
+    incremental = input("Skip articles unchanged since the last sync? (y/N): ").strip().lower() == "y"
     if mode == "1":
         article_id = input("Enter article ID: ").strip()
         print(f"Processing article {article_id} from site {site_id}...")
-        article_workflow(article_id, site_id)
+        article_workflow(article_id, site_id, incremental=incremental)
     else:
         manual_id = input("Enter manual ID: ").strip()
+        index = input("Summarize the articles and send them to the vectorstore? (y/N): ").strip().lower() == "y"
         print(f"Processing manual {manual_id} from site {site_id}...")
-        manual_workflow(manual_id, site_id)
+        manual_workflow(manual_id, site_id, incremental=incremental, index=index)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+In-memory hand-off of one article between the pipeline stages.
+The exporter fills in the HTML, TOC metadata and the paths of the downloaded
+images, tag_and_markdown adds the markdown, and the document/vectorstore stages
+read everything from the bundle. Writing the article folder to disk is optional.
+"""
+import json
+import os
+import shutil
+
+from src.screensteps_client import link_or_copy
+from src.utils import ArticleContext
+
+
+class ArticleBundle:
+    """
+    Everything the pipeline knows about one fetched article.
+
+    Args:
+        article_id (str): The ID of the article.
+        toc (dict): Site/manual/chapter/article metadata, as saved in {article_id}.json.
+        html (str, optional): The article HTML with asset URLs pointing at images/ and attachments/.
+        markdown (str, optional): The tagged markdown, once it has been created.
+        images (dict, optional): Image file name -> path of the downloaded file.
+        attachments (dict, optional): Attachment file name -> path of the downloaded file.
+        unchanged (bool, optional): True if the article was skipped by an incremental sync.
+    """
+
+    def __init__(self, article_id, toc, html=None, markdown=None, images=None, attachments=None, unchanged=False):
+        self.article_id = str(article_id)
+        self.toc = toc
+        self.html = html
+        self.markdown = markdown
+        self.images = images or {}
+        self.attachments = attachments or {}
+        self.unchanged = unchanged
+        self.folder = None
+        # Private folder the downloaded files are linked into, see release()
+        self.staging_folder = None
+        self._context = None
+
+    @property
+    def context(self):
+        """The ArticleContext of the TOC metadata, parsed on first use."""
+        if self._context is None:
+            self._context = ArticleContext(self.toc)
+        return self._context
+
+    @classmethod
+    def load(cls, folder, article_id=None):
+        """
+        Read an article folder written by save() or by the exporters.
+
+        Args:
+            folder (str): The article folder.
+            article_id (str, optional): The ID of the article. Defaults to the folder name.
+
+        Returns:
+            ArticleBundle: The bundle, or None if the folder has no {article_id}.json.
+        """
+        article_id = str(article_id or os.path.basename(os.path.normpath(folder)))
+        json_file_path = os.path.join(folder, f"{article_id}.json")
+        if not os.path.exists(json_file_path):
+            print(f"Metadata file for article {article_id} does not exist at {json_file_path}.")
+            return None
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            toc = json.load(f)
+
+        bundle = cls(article_id, toc,
+                     html=_read_text(os.path.join(folder, f"{article_id}.html")),
+                     markdown=_read_text(os.path.join(folder, f"{article_id}.md")),
+                     images=_list_files(os.path.join(folder, 'images')),
+                     attachments=_list_files(os.path.join(folder, 'attachments')))
+        bundle.folder = folder
+        return bundle
+
+    def save(self, folder):
+        """
+        Write the bundle out as an article folder ({id}.json, {id}.html, {id}.md,
+        images/, attachments/). Downloaded files are hardlinked when possible.
+
+        Returns:
+            str: The article folder.
+        """
+        for directory in [folder, os.path.join(folder, 'images'), os.path.join(folder, 'attachments')]:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(folder, f"{self.article_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.toc, f, indent=2)
+        if self.html is not None:
+            _write_text(os.path.join(folder, f"{self.article_id}.html"), self.html)
+        if self.markdown is not None:
+            _write_text(os.path.join(folder, f"{self.article_id}.md"), self.markdown)
+
+        for subfolder, files in (('images', self.images), ('attachments', self.attachments)):
+            for name, path in files.items():
+                destination = os.path.join(folder, subfolder, name)
+                if os.path.abspath(path) != os.path.abspath(destination):
+                    link_or_copy(path, destination)
+
+        self.folder = folder
+        return folder
+
+    def release(self):
+        """Delete the staging folder holding the bundle's own links to the downloaded files."""
+        if self.staging_folder and os.path.isdir(self.staging_folder):
+            shutil.rmtree(self.staging_folder, ignore_errors=True)
+        self.staging_folder = None
+
+    def save_markdown(self):
+        """Write the markdown next to the other files if the bundle has been saved to a folder."""
+        if self.folder and self.markdown is not None:
+            _write_text(os.path.join(self.folder, f"{self.article_id}.md"), self.markdown)
+
+
+def _read_text(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def _list_files(folder):
+    if not os.path.isdir(folder):
+        return {}
+    return {name: os.path.join(folder, name) for name in sorted(os.listdir(folder))
+            if not name.startswith('.') and os.path.isfile(os.path.join(folder, name))}
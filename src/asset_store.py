@@ -0,0 +1,111 @@
+"""
+Content-addressed store for downloaded images and attachments.
+Blobs are kept once per content hash and indexed by the URL they came from,
+so an asset shared by many articles (or fetched again on the next run) is only
+downloaded once. Article folders get hardlinks into the store.
+"""
+import hashlib
+import os
+import threading
+
+from src.config import ASSET_STORE_DIR, ASSET_STORE_MAX_BYTES, DOWNLOAD_CHUNK_SIZE
+from src.disk_cache import DiskCache
+
+# The URL index only holds small JSON records
+URL_INDEX_MAX_BYTES = 64 * 1024 * 1024
+
+
+def file_sha256(path):
+    """Return the hex sha256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AssetStore:
+    """
+    Blob store keyed by content hash, with a URL -> hash index in front of it.
+
+    Args:
+        directory (str, optional): Root folder of the store.
+        max_bytes (int, optional): Size limit for the blobs, evicted least recently used first.
+    """
+
+    def __init__(self, directory=ASSET_STORE_DIR, max_bytes=ASSET_STORE_MAX_BYTES):
+        self.blobs = DiskCache(os.path.join(directory, 'blobs'), max_bytes)
+        self.urls = DiskCache(os.path.join(directory, 'urls'), URL_INDEX_MAX_BYTES)
+        self.staging = os.path.join(directory, 'staging')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, url):
+        """
+        Find the stored copy of a URL.
+
+        Returns:
+            str: Path of the blob, or None if the URL hasn't been stored (or was evicted).
+        """
+        entry = self.urls.get_json(url)
+        path = self.blobs.path_for(entry['sha256']) if entry else None
+        if path is None or not os.path.exists(path):
+            with self._lock:
+                self.misses += 1
+            return None
+        self.blobs.touch(path)
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def add_file(self, url, path):
+        """
+        Store a freshly downloaded file and index it under its URL.
+        Identical content downloaded from different URLs shares a single blob.
+
+        Returns:
+            str: Path of the blob.
+        """
+        digest = file_sha256(path)
+        blob_path = self.blobs.path_for(digest)
+        if os.path.exists(blob_path):
+            self.blobs.touch(blob_path)
+        else:
+            blob_path = self.blobs.set_file(digest, path)
+        self.urls.set_json(url, {'sha256': digest, 'size': os.path.getsize(blob_path)})
+        return blob_path
+
+    def staging_dir(self, url):
+        """
+        Return the folder a URL is downloaded into before it's added to the store.
+        It's on the same filesystem as the blobs, and stable between runs so an
+        interrupted download can be resumed.
+        """
+        directory = os.path.join(self.staging, hashlib.sha256(url.encode('utf-8')).hexdigest()[:16])
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def stats(self):
+        """Return URL hit/miss counters and the size of the blob store."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'bytes': self.blobs.stats()['bytes'],
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_asset_store():
+    """Return the process-wide asset store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AssetStore()
+    return _store
@@ -0,0 +1,165 @@
+"""
+Token estimates for summary requests, used by create_documents to decide how
+far a chunk has to be split before anything is sent to GPT.
+A chunk's cost is its text tokens plus the vision tokens of every image it
+references, sized the way the API bills them (512px tiles after downscaling).
+In "captions" mode the images are described in separate requests, so each one
+only costs the tokens of its caption in the summary request.
+"""
+import math
+import os
+import re
+import struct
+
+from src.config import SUMMARY_MODEL, SUMMARY_TOKEN_BUDGET, SUMMARY_MAX_IMAGES, VISION_IMAGE_MAX_EDGE
+from src.config import SUMMARY_MODE, CAPTION_MAX_IMAGES, CAPTION_TOKENS
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+IMAGE_TAG_PATTERN = re.compile(r'<Image\d+ src="([^"]+)">')
+
+# Vision billing for detail="high" images
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+IMAGE_TILE_SIZE = 512
+IMAGE_FIT_EDGE = 2048
+IMAGE_SHORT_EDGE = 768
+# Used when an image's size can't be read: a 1536x864 screenshot
+DEFAULT_IMAGE_TOKENS = IMAGE_BASE_TOKENS + 6 * IMAGE_TILE_TOKENS
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded and tiktoken is not None:
+        try:
+            try:
+                _encoding = tiktoken.encoding_for_model(SUMMARY_MODEL)
+            except KeyError:
+                # Models newer than the installed tiktoken use the gpt-4o encoding
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # tiktoken downloads its vocabulary on first use, which fails offline
+            print(f"Warning: Could not load the tiktoken encoding, estimating tokens from length: {e}")
+    _encoding_loaded = True
+    return _encoding
+
+
+def estimate_text_tokens(text):
+    """Count the tokens of text with tiktoken, or estimate 4 characters per token without it."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def image_size(path):
+    """
+    Read the pixel size of a PNG, GIF, JPEG or WebP file from its header.
+
+    Returns:
+        tuple: (width, height), or None if the format isn't recognised.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(32)
+            if head.startswith(b'\x89PNG\r\n\x1a\n'):
+                return struct.unpack('>II', head[16:24])
+            if head.startswith((b'GIF87a', b'GIF89a')):
+                return struct.unpack('<HH', head[6:10])
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                return _webp_size(head)
+            if head.startswith(b'\xff\xd8'):
+                f.seek(2)
+                return _jpeg_size(f)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def _webp_size(head):
+    chunk = head[12:16]
+    if chunk == b'VP8X':
+        return 1 + int.from_bytes(head[24:27], 'little'), 1 + int.from_bytes(head[27:30], 'little')
+    if chunk == b'VP8L':
+        bits = int.from_bytes(head[21:25], 'little')
+        return 1 + (bits & 0x3FFF), 1 + ((bits >> 14) & 0x3FFF)
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    return None
+
+
+def _jpeg_size(f):
+    # Walk the segments up to the start-of-frame marker
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def estimate_image_tokens(size, max_edge=VISION_IMAGE_MAX_EDGE):
+    """
+    Vision tokens of an image of the given pixel size, after it has been
+    downscaled to max_edge (see convert_images.prepare_vision_image).
+    """
+    if size is None:
+        return DEFAULT_IMAGE_TOKENS
+    width, height = size
+    if not width or not height:
+        return DEFAULT_IMAGE_TOKENS
+    for edge in (max_edge, IMAGE_FIT_EDGE):
+        if edge and max(width, height) > edge:
+            scale = edge / max(width, height)
+            width, height = width * scale, height * scale
+    if min(width, height) > IMAGE_SHORT_EDGE:
+        scale = IMAGE_SHORT_EDGE / min(width, height)
+        width, height = width * scale, height * scale
+    tiles = math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(height / IMAGE_TILE_SIZE)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+def estimate_chunk_tokens(text, image_paths):
+    """
+    Estimate the tokens a summary request for text would use.
+
+    Args:
+        text (str): Chunk text containing <ImageN src="..."> tags.
+        image_paths (list): Local paths of the referenced images, None where unknown.
+
+    Returns:
+        int: Text tokens plus image tokens.
+    """
+    tokens = estimate_text_tokens(IMAGE_TAG_PATTERN.sub('', text))
+    for path in image_paths:
+        tokens += estimate_image_tokens(image_size(path) if path else None)
+    return tokens
+
+
+def max_chunk_images(mode=SUMMARY_MODE):
+    """Return how many images a chunk can have before it's split further."""
+    return CAPTION_MAX_IMAGES if mode == "captions" else SUMMARY_MAX_IMAGES
+
+
+def chunk_fits(text, image_paths, budget=SUMMARY_TOKEN_BUDGET, max_images=None, mode=SUMMARY_MODE):
+    """Return True if text can be summarized in one request without splitting it further."""
+    if max_images is None:
+        max_images = max_chunk_images(mode)
+    if len(image_paths) > max_images:
+        return False
+    if mode == "captions":
+        tokens = estimate_text_tokens(IMAGE_TAG_PATTERN.sub('', text)) + CAPTION_TOKENS * len(image_paths)
+        return tokens <= budget
+    return estimate_chunk_tokens(text, image_paths) <= budget
@@ -29,3 +29,112 @@ Ensure the summary captures the essence of the process and integrates the images
 Images are numbered sequentially (Image 1:, Image 2:, etc.) based on their order of appearance in the original article.
 ====================================================================='''}
 
+
+# ScreenSteps HTTP client configuration
+SCREENSTEPS_TIMEOUT = (10, 60)  # (connect, read) seconds
+SCREENSTEPS_API_POOL_SIZE = 16  # keep-alive connections to <site>.screenstepslive.com
+SCREENSTEPS_ASSET_POOL_SIZE = 32  # keep-alive connections per image/attachment CDN host
+SCREENSTEPS_POOL_HOSTS = 10  # number of distinct hosts to keep connection pools for
+FETCH_WORKERS = 8  # chapters/articles fetched in parallel when exporting a manual
+ASSET_DOWNLOAD_WORKERS = 16  # images/attachments downloaded in parallel
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # bytes read per streamed download chunk
+DOWNLOAD_RETRIES = 4  # times an interrupted download is resumed before giving up
+DOWNLOAD_RETRY_BACKOFF = 1.0  # seconds before the first resume, doubled on every retry
+
+# ScreenSteps API rate limiting (requests per second, shared by all workers)
+RATE_LIMIT_INITIAL_RATE = 5.0
+RATE_LIMIT_MIN_RATE = 0.2
+RATE_LIMIT_MAX_RATE = 20.0
+RATE_LIMIT_BURST = 5
+RATE_LIMIT_RAMP_STEP = 0.1  # added to the rate after every successful request
+RATE_LIMIT_SAFETY = 0.9  # stay at this fraction of the rate that triggered a 429
+
+# Local state (incremental sync) lives next to the project
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYNC_STATE_PATH = os.path.join(PROJECT_ROOT, "state", "sync_state.json")
+
+# Persistent caches
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache")
+RESPONSE_CACHE_DIR = os.path.join(CACHE_DIR, "responses")
+RESPONSE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+RESPONSE_CACHE_TTL = 15 * 60  # seconds site/manual/chapter responses are used without revalidation
+
+# Exporter engine used by workflows: "threads" (ss_exporter) or "asyncio" (ss_exporter_async)
+EXPORTER_ENGINE = os.environ.get("EXPORTER_ENGINE", "threads")
+# Articles are handed between the workflow stages in memory; set to "1" to also
+# write (and keep) each article folder under temp/ for inspection
+PERSIST_ARTICLE_FILES = os.environ.get("PERSIST_ARTICLE_FILES", "0") == "1"
+ASSET_STORE_DIR = os.path.join(CACHE_DIR, "assets")
+BUNDLE_STAGING_DIR = os.path.join(CACHE_DIR, "bundles")  # per-article links to asset blobs while it's processed
+ASSET_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # downloaded images/attachments kept across runs
+
+# Which content blocks get downloaded: "rag" only fetches what the RAG pipeline
+# reads (HTML + images), "mirror" also fetches attachments
+FETCH_PROFILES = {
+    "rag": ("images",),
+    "mirror": ("images", "attachments"),
+}
+FETCH_PROFILE = os.environ.get("FETCH_PROFILE", "rag")  # profile used by workflows
+
+# GPT summaries requested in parallel (shared by every article and split level)
+SUMMARY_WORKERS = 8
+SUMMARY_MODEL = "gpt-4.1"
+# Chunks over these limits are split further before any summary is requested
+SUMMARY_TOKEN_BUDGET = 12000  # estimated text + image tokens per request
+SUMMARY_MAX_IMAGES = 10
+# Summaries are cached by chunk text, image contents, prompt and model
+SUMMARY_CACHE_DIR = os.path.join(CACHE_DIR, "summaries")
+SUMMARY_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Images are downscaled and re-encoded before they're sent to the vision model
+VISION_IMAGE_MAX_EDGE = 1536  # pixels, None sends the original files
+VISION_IMAGE_FORMAT = "webp"  # "webp" or "jpeg"
+VISION_IMAGE_QUALITY = 85
+VISION_IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "vision_images")
+VISION_IMAGE_CACHE_MAX_BYTES = 500 * 1024 * 1024
+ASSET_MAX_BYTES = 100 * 1024 * 1024  # larger images/attachments are not downloaded, None for no limit
+
+# How process_article updates Pinecone: "diff" only re-summarizes, re-embeds and
+# upserts the chunks that changed since the last run, "replace" deletes every
+# vector of the article and uploads all of them again
+VECTOR_SYNC_MODE = os.environ.get("VECTOR_SYNC_MODE", "diff")
+PINECONE_BATCH_SIZE = 100  # vectors fetched, upserted or deleted per request
+
+# Documents are embedded and upserted in micro-batches of this size while the
+# rest of the article is still being summarized; set STREAM_DOCUMENTS to "0" to
+# build every document of an article before anything is uploaded
+STREAM_DOCUMENTS = os.environ.get("STREAM_DOCUMENTS", "1") == "1"
+EMBED_BATCH_SIZE = 16
+
+# Summary embeddings are cached by model and text, so a boilerplate section
+# shared by many articles is embedded once
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, "embeddings")
+EMBEDDING_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# How chunk summaries are made: "vision" sends a chunk's text and images in one
+# request, "captions" describes every image in its own small request (cached by
+# image hash, so screenshots shared by many articles are described once) and
+# then writes the summary from the text and captions in a text-only request
+SUMMARY_MODE = os.environ.get("SUMMARY_MODE", "vision")
+CAPTION_MODEL = "gpt-4.1-mini"
+COMPOSE_MODEL = "gpt-4.1-mini"
+CAPTION_WORKERS = 16  # image captions requested in parallel
+CAPTION_MAX_IMAGES = 40  # images per chunk in "captions" mode, SUMMARY_MAX_IMAGES applies to "vision"
+CAPTION_TOKENS = 200  # estimated tokens of one caption in the compose request
+
+CAPTION_PROMPT = {"type": "text", "text": '''You are a bot preparing images from the Orbitvu user manual for a RAG database.
+Describe the image in a few sentences: what it shows, any visible interface elements, labels, buttons, settings or text, and the step of a process it appears to illustrate.
+If the image shows a compliance statement, simply state: "The device meets required standards and regulations."
+Avoid any introductory or concluding phrases.'''}
+
+COMPOSE_PROMPT = {"type": "text", "text": '''You are a bot preparing chunks for a RAG database. Based on the provided text from the Orbitvu user manual, in which every image has been replaced by a description of it (Image 1: ..., Image 2: ..., etc.):
+
+1. Create a concise summary of the process or processes shown in the excerpt.
+2. Describe the images in the context of the process, ensuring the descriptions align with the number and order of images in the text.
+3. Avoid any introductory or concluding phrases like "Here is the summary" or "Ok, let's begin."
+4. Focus solely on the content relevant to embedding in a retrieval database. Exclude any unnecessary information.
+5. If images show compliance statements, simply state: "The device meets required standards and regulations."
+
+Ensure the summary captures the essence of the process and integrates the images meaningfully into the context.
+====================================================================='''}
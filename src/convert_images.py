@@ -1,6 +1,23 @@
+import mimetypes
 import os
 import shutil
 import subprocess
+import threading
+
+from src.config import (
+    VISION_IMAGE_MAX_EDGE,
+    VISION_IMAGE_FORMAT,
+    VISION_IMAGE_QUALITY,
+    VISION_IMAGE_CACHE_DIR,
+    VISION_IMAGE_CACHE_MAX_BYTES,
+)
+from src.asset_store import file_sha256
+from src.disk_cache import DiskCache
+
+IMAGE_MIME_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png", "gif": "image/gif"}
+
+_vision_cache = None
+_vision_cache_lock = threading.Lock()
 
 
 def convert_images_to_webp(source_folder, target_folder):
@@ -9,18 +26,22 @@ def convert_images_to_webp(source_folder, target_folder):
     and save them in a new folder under target_base_path.
     If the target folder exists, it will be replaced.
     Uses ImageMagick's `convert` command for conversion.
+    source_folder can also be a dict of file name -> path (ArticleBundle.images).
     """
-    if not os.path.isdir(source_folder):
+    if isinstance(source_folder, dict):
+        sources = source_folder
+    elif not os.path.isdir(source_folder):
         print(f"Source folder does not exist: {source_folder}")
         return
+    else:
+        sources = {filename: os.path.join(source_folder, filename) for filename in os.listdir(source_folder)}
 
     # Remove target folder if it exists
     if os.path.exists(target_folder):
         shutil.rmtree(target_folder)
     os.makedirs(target_folder, exist_ok=True)
 
-    for filename in os.listdir(source_folder):
-        src_path = os.path.join(source_folder, filename)
+    for filename, src_path in sources.items():
         if not os.path.isfile(src_path):
             continue
 
@@ -41,6 +62,71 @@ def convert_images_to_webp(source_folder, target_folder):
 
     print(f"Images converted and saved to {target_folder}")
 
+def get_vision_cache():
+    """Return the on-disk cache of preprocessed vision images, creating it on first use."""
+    global _vision_cache
+    with _vision_cache_lock:
+        if _vision_cache is None:
+            _vision_cache = DiskCache(VISION_IMAGE_CACHE_DIR, VISION_IMAGE_CACHE_MAX_BYTES)
+    return _vision_cache
+
+
+def sniff_mime_type(data, filename=''):
+    """
+    Work out the MIME type of image bytes from their signature,
+    falling back to the file extension and then to image/jpeg.
+    """
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "image/png"
+    if data.startswith(b'\xff\xd8\xff'):
+        return "image/jpeg"
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return "image/gif"
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return "image/webp"
+    return mimetypes.guess_type(filename)[0] or "image/jpeg"
+
+
+def prepare_vision_image(image_path, max_edge=VISION_IMAGE_MAX_EDGE, image_format=VISION_IMAGE_FORMAT,
+                         quality=VISION_IMAGE_QUALITY):
+    """
+    Shrink an image for a vision request: downscale it to max_edge pixels on the
+    longest side and re-encode it with ImageMagick. The result is cached by the
+    hash of the image and the settings. If re-encoding doesn't make the image
+    smaller (or ImageMagick fails) the original bytes are used.
+
+    Returns:
+        tuple: (mime_type, image bytes)
+    """
+    with open(image_path, "rb") as f:
+        original = f.read()
+    if max_edge is None:
+        return sniff_mime_type(original, image_path), original
+
+    cache = get_vision_cache()
+    key = f"{file_sha256(image_path)} {max_edge} {image_format} {quality}"
+    cached = cache.get(key)
+    if cached is not None:
+        mime_type, _, data = cached.partition(b'\n')
+        return mime_type.decode('ascii'), data
+
+    try:
+        # [0] only takes the first frame of animated images
+        result = subprocess.run(
+            ["magick", image_path + "[0]", "-auto-orient", "-resize", f"{max_edge}x{max_edge}>", "-strip",
+             "-quality", str(quality), f"{image_format}:-"],
+            check=True, capture_output=True
+        )
+        data, mime_type = result.stdout, IMAGE_MIME_TYPES[image_format]
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Failed to preprocess {os.path.basename(image_path)} using ImageMagick, sending the original: {e}")
+        return sniff_mime_type(original, image_path), original
+
+    if not data or len(data) >= len(original):
+        data, mime_type = original, sniff_mime_type(original, image_path)
+    cache.set(key, mime_type.encode('ascii') + b'\n' + data)
+    return mime_type, data
+
 if __name__ == "__main__":
     # Example usage:
     convert_images_to_webp("/Users/zofiabochenek/Desktop/cli_updater/temp/66870/1724639/images", "/Users/zofiabochenek/Desktop/cli_updater/temp/images")
@@ -2,6 +2,7 @@
 import os
 import glob
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 # Third-party imports
 from tqdm import tqdm
@@ -12,34 +13,70 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
 
 from src.utils import *
-from src.gpt_summary import create_gpt_summary
+from src.config import SUMMARY_WORKERS
+from src.gpt_summary import create_gpt_summary, chunk_summary_key, get_summary_cache, resolve_image_path
+from src.chunk_planner import chunk_fits, max_chunk_images
 
 
 # Initialize global variables*
 langchain_embed_model = OpenAIEmbeddings(model="text-embedding-ada-002", openai_api_key=os.environ.get("OPENAI_API_KEY"))
+# Chunk summaries are requested through this pool; documents are still assembled in chunk order
+summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="summary")
 
 
-def load_documents(article_id, article_dir_path, software=False):
+def load_documents(article_id, article_dir_path, software=False, bundle=None, known_summaries=None, stream=False,
+                   failures=None):
+    """
+    Split an article into summarized chunk documents.
+    known_summaries maps (chunk text, summary key) -> summary for chunks summarized on
+    an earlier run (see pinecone_ops.previous_summaries); those chunks aren't sent to GPT
+    again as long as their summary key (model, prompt, images, mode) hasn't changed.
+    With stream=True a generator is returned that yields the documents in chunk order
+    as their summaries complete, instead of a list built once all of them are done.
+    If failures is a list, an error message is appended to it for every part of the
+    article that couldn't be turned into documents, so callers can tell a complete
+    article from one that stopped early.
+    """
+    documents = iter_article_documents(article_id, article_dir_path, software, bundle, known_summaries, failures)
+    if stream:
+        return documents
+    return list(documents)
 
-    # Add a check at the beginning to handle None values
-    md_file = os.path.join(article_dir_path, f"{article_id}.md")
+def iter_article_documents(article_id, article_dir_path, software=False, bundle=None, known_summaries=None,
+                           failures=None):
+    # An ArticleBundle carries the markdown, metadata and images in memory
+    if bundle is not None:
+        if bundle.markdown is None:
+            print("Error: No markdown in the article bundle provided to load_documents")
+            if failures is not None:
+                failures.append("No markdown in the article bundle")
+            return
+        content = bundle.markdown
+        context = bundle.context
+        images = bundle.images
+    else:
+        # Add a check at the beginning to handle None values
+        md_file = os.path.join(article_dir_path, f"{article_id}.md")
 
-    # try:
-        # Read the markdown file
-    if md_file is None or not os.path.exists(md_file):
-        print("Error: No file provided to load_documents")
-        return []
+        # try:
+            # Read the markdown file
+        if md_file is None or not os.path.exists(md_file):
+            print("Error: No file provided to load_documents")
+            if failures is not None:
+                failures.append(f"No markdown file at {md_file}")
+            return
 
-    with open(md_file, "r", encoding="utf-8") as f:
-        content = f.read()
+        with open(md_file, "r", encoding="utf-8") as f:
+            content = f.read()
+        context = load_article_context(article_id, article_dir_path)
+        images = None
     
-    documents = []
     text_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=[("##", "Header 2")], strip_headers=False)
 
-    article_title = get_article_title(article_id, article_dir_path)
+    article_title = context.article_title
     url_article_title = article_title.lower().strip().replace(" ", "-").replace("[", "-").replace("]", "-").replace("'", "-")
-    chapter_title = get_chapter_title(article_id, article_dir_path)
-    manual_title = get_manual_title(article_id, article_dir_path)
+    chapter_title = context.chapter_title
+    manual_title = context.manual_title
 
     if software:
         url = f"https://public.manuals.orbitvu.com/a/{article_id}-{url_article_title}".replace("--", "-")
@@ -55,35 +92,74 @@ def load_documents(article_id, article_dir_path, software=False):
         "manual_title": manual_title,
         "section_title": False,
         "url": url,
+        "summary_key": False,
     }
     
     # Process the document using our recursive function
-    file_documents = create_documents(
+    count = 0
+    for doc in create_documents(
         content=content,
         text_splitter=text_splitter,
         metadata=metadata,
         article_path=article_dir_path,
-    )
-    
-    documents.extend(file_documents)
+        images=images,
+        known_summaries=known_summaries,
+        stream=True,
+        failures=failures,
+    ):
+        count += 1
+        yield doc
         
     # except Exception as e:
     #     # Print errors without progress bar
     #     print(f"Error loading {md_file}: {str(e)}")
 
-    print(f"Successfully processed {len(documents)} total document chunks")
-    return documents
+    print(f"Successfully processed {count} total document chunks")
+    cache_stats = get_summary_cache().stats()
+    print(f"Summary cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+          f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['bytes'] / 1024 / 1024:.1f} MB)")
 
-def create_documents(content, text_splitter, metadata, recursion_depth=0, max_depth=4, article_path=None):
-    documents = []
+def create_documents(content, text_splitter, metadata, recursion_depth=0, max_depth=4, article_path=None, images=None,
+                     known_summaries=None, stream=False, failures=None):
+    """
+    Summarize the chunks text_splitter cuts content into, splitting further where needed.
+    Returns a list of documents, or with stream=True a generator yielding them in order.
+    Errors are appended to failures (if given) instead of being raised.
+    """
+    documents = iter_documents(content, text_splitter, metadata, recursion_depth, max_depth,
+                               article_path, images, known_summaries, failures)
+    if stream:
+        return documents
+    return list(documents)
+
+def iter_documents(content, text_splitter, metadata, recursion_depth=0, max_depth=4, article_path=None, images=None,
+                   known_summaries=None, failures=None):
     base_url = metadata["url"]
     article_id = metadata["article_id"]
 
-    images_path = os.path.join(article_path, "images")
+    # images maps file names to paths when the article comes from an ArticleBundle
+    images_path = images if images is not None else os.path.join(article_path, "images")
 
+    summary_futures = []
     try:
         # Apply the text splitter
         md_chunks = text_splitter.split_text(content)
+        page_contents = [md_chunk.page_content if hasattr(md_chunk, 'metadata') else md_chunk for md_chunk in md_chunks]
+
+        # Chunks whose estimated text + image tokens are over the budget go straight
+        # to the next split level instead of costing a GPT round-trip first
+        over_budget = [
+            recursion_depth < max_depth and not chunk_fits(page_content, chunk_image_paths(page_content, images_path))
+            for page_content in page_contents
+        ]
+
+        # Request the summaries of every chunk on this level up front, chunks with
+        # too many images are re-split below instead
+        summary_futures = [
+            request_summary(page_content, images_path, known_summaries)
+            if number_of_tags(page_content) <= max_chunk_images() and not split else None
+            for page_content, split in zip(page_contents, over_budget)
+        ]
         
         # Create progress bar for chunks in this file
         chunk_progress = tqdm(
@@ -103,12 +179,12 @@ def create_documents(content, text_splitter, metadata, recursion_depth=0, max_de
                     metadata["url"] = base_url + f"#{section_title.lower().replace(' ', '-')}"
             
             # Create summary of the section
-            page_content = md_chunk.page_content if hasattr(md_chunk, 'metadata') else md_chunk
+            page_content = page_contents[i]
             # Set the id
-            if number_of_tags(page_content) > 10:
+            if summary_futures[i] is None:
                 summary = ""
             else:
-                summary = create_gpt_summary(page_content, images_path)
+                summary, summary_key = summary_futures[i].result()
                 if len(summary) > 1000:
                     if len(summary) > 2000:
                         chunk_progress.write(f"\033[31m\nVery long summary: {len(summary)}\n\033[0m")
@@ -132,16 +208,18 @@ def create_documents(content, text_splitter, metadata, recursion_depth=0, max_de
                     # Store a local copy of metadata to avoid modifying the parent's metadata
                     local_metadata = metadata.copy()
                     
-                    sub_documents = create_documents(
+                    yield from iter_documents(
                         page_content, 
                         new_splitter, 
                         local_metadata, 
                         recursion_depth + 1,
                         max_depth,
-                        article_path=article_path
+                        article_path=article_path,
+                        images=images,
+                        known_summaries=known_summaries,
+                        failures=failures
                     )
                     
-                    documents.extend(sub_documents)
                     chunk_progress.write(f"Recursion depth {recursion_depth+1} for large chunk in article {article_id} Successful")
                     
                 else:
@@ -153,7 +231,7 @@ def create_documents(content, text_splitter, metadata, recursion_depth=0, max_de
                         page_content="This section contains technical content from the manual that is too complex to summarize.",
                         metadata=metadata.copy()
                     )
-                    documents.append(doc)
+                    yield doc
                     # Reset metadata for next iteration
                     metadata["url"] = base_url
                     metadata["section_title"] = False
@@ -161,31 +239,54 @@ def create_documents(content, text_splitter, metadata, recursion_depth=0, max_de
             else:
                  # Clean image descriptions to get just the image tags                
                 metadata['original_text'] = page_content
+                metadata['summary_key'] = summary_key
 
                 doc = Document(
                     page_content=summary,
-                    metadata=metadata
+                    metadata=metadata.copy()
                 )
-                documents.append(doc)
+                yield doc
 
                 # Reset metadata for next iteration
                 metadata["url"] = base_url
                 metadata["section_title"] = False
                 metadata["original_text"] = False
+                metadata["summary_key"] = False
             
             # Update chunk progress bar
             chunk_progress.update(1)
         
         # Close the chunk progress bar when done
         chunk_progress.close()
-            
-        return documents
         
     except Exception as e:
         # Print errors without master progress bar
         print(f"Error processing chunk in article {article_id} (depth={recursion_depth}): {str(e)}")
-        return documents
+        if failures is not None:
+            failures.append(f"depth={recursion_depth}: {e}")
+    finally:
+        # Don't pay for summaries that will never be used (also when a stream is abandoned)
+        for future in summary_futures:
+            if future is not None:
+                future.cancel()
     
+def request_summary(page_content, images_path, known_summaries=None):
+    """Start summarizing a chunk on the summary pool, the future resolves to (summary, summary key)."""
+    return summary_executor.submit(summarize_chunk, page_content, images_path, known_summaries)
+
+def summarize_chunk(page_content, images_path, known_summaries=None):
+    """
+    Summarize a chunk, reusing the summary stored for it on an earlier run when the
+    chunk text and its summary key are unchanged.
+
+    Returns:
+        tuple: (summary, summary key)
+    """
+    key = chunk_summary_key(page_content, images_path)
+    if known_summaries and (page_content, key) in known_summaries:
+        return known_summaries[(page_content, key)], key
+    return create_gpt_summary(page_content, images_path, key=key), key
+
 def number_of_tags(text):
     """
     Count the number of <Image{n}> tags in the text.
@@ -193,6 +294,19 @@ def number_of_tags(text):
     # Updated regex to match the new pattern <Image{n} src="...">
     return len(re.findall(r'<Image\d+ src="[^"]+">', text))
 
+def chunk_image_paths(text, images_path):
+    """
+    List the local paths of the images referenced by the <Image{n}> tags in the text,
+    None for images that aren't available.
+    """
+    paths = []
+    for src in re.findall(r'<Image\d+ src="([^"]+)">', text):
+        try:
+            paths.append(resolve_image_path(images_path, os.path.basename(src)))
+        except KeyError:
+            paths.append(None)
+    return paths
+
 
 
 if __name__ == "__main__":
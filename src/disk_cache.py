@@ -0,0 +1,166 @@
+"""
+Small on-disk key/value cache shared by the persistent caches of the project.
+Entries are stored one file per key; when the cache grows past its size limit
+the least recently used entries are evicted.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+
+class DiskCache:
+    """
+    Size-bounded file cache with LRU eviction and hit/miss counters.
+
+    Args:
+        directory (str): Folder the entries are stored in.
+        max_bytes (int, optional): Size limit of the cache. None means unbounded.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def path_for(self, key):
+        """Return the file an entry for key is stored in."""
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key):
+        """
+        Read an entry.
+
+        Returns:
+            bytes: The stored value, or None on a miss.
+        """
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        self.touch(path)
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def set(self, key, data):
+        """Store bytes under key, replacing any previous value."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._grow(len(data) - old_size)
+
+    def set_file(self, key, source_path):
+        """
+        Store an existing file under key without reading it into memory.
+        The entry is hardlinked to source_path when possible, copied otherwise.
+
+        Returns:
+            str: Path of the stored entry.
+        """
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.' + str(threading.get_ident()) + '.tmp'
+        try:
+            try:
+                os.link(source_path, temp_path)
+            except OSError:
+                shutil.copyfile(source_path, temp_path)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._grow(os.path.getsize(path) - old_size)
+        return path
+
+    def get_json(self, key):
+        """Read an entry stored with set_json, or None on a miss."""
+        data = self.get(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError:
+            return None
+
+    def set_json(self, key, value):
+        """Store a JSON-serialisable value under key."""
+        self.set(key, json.dumps(value).encode('utf-8'))
+
+    def touch(self, path):
+        """Mark an entry as recently used."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'bytes': self._size,
+            }
+
+    def _grow(self, delta):
+        with self._lock:
+            self._size += delta
+            over_limit = self.max_bytes is not None and self._size > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its size limit."""
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            size = sum(entry[1] for entry in entries)
+            # Evict down to 90% so we don't walk the folder again on the next write
+            target = self.max_bytes * 0.9
+            for path, entry_size, _ in entries:
+                if size <= target:
+                    break
+                try:
+                    os.remove(path)
+                    size -= entry_size
+                except OSError:
+                    pass
+            self._size = size
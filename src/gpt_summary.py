@@ -1,31 +1,193 @@
 import os
 import re
+import hashlib
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
 import base64
 from openai import OpenAI
 from groq import Groq
 load_dotenv()
-from src.config import SUMMARY_PROMPT
+from src.config import SUMMARY_PROMPT, SUMMARY_MODEL, SUMMARY_CACHE_DIR, SUMMARY_CACHE_MAX_BYTES
+from src.config import SUMMARY_MODE, CAPTION_PROMPT, CAPTION_MODEL, COMPOSE_PROMPT, COMPOSE_MODEL, CAPTION_WORKERS
+from src.asset_store import file_sha256
+from src.disk_cache import DiskCache
+from src.convert_images import prepare_vision_image
+from src.config import VISION_IMAGE_MAX_EDGE, VISION_IMAGE_FORMAT, VISION_IMAGE_QUALITY
 
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+IMAGE_TAG_PATTERN = r'<Image(\d+) src="([^"]+)">'
+# "Image 5", "Image5:", "Images 2, 3 and 4", "Images 6-8" in a summary
+IMAGE_REFERENCE_PATTERN = r'\b(Images?\s*)(\d+(?:\s*(?:,|and|&|-|–|to)\s*\d+)*)\b'
+# Cached summaries refer to images by their position in the chunk: "Image <#1>"
+RELATIVE_IMAGE_PATTERN = r'<#(\d+)>'
+
+_summary_cache = None
+_summary_cache_lock = threading.Lock()
+# Summary and caption requests in progress, so identical ones made at the same time share one call
+_pending_requests = {}
+_pending_requests_lock = threading.Lock()
+# Captions have their own pool: they're requested from summary workers, which wait for them
+caption_executor = ThreadPoolExecutor(max_workers=CAPTION_WORKERS, thread_name_prefix="caption")
+
+def get_summary_cache():
+    """Return the on-disk cache of chunk summaries, creating it on first use."""
+    global _summary_cache
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            _summary_cache = DiskCache(SUMMARY_CACHE_DIR, SUMMARY_CACHE_MAX_BYTES)
+    return _summary_cache
+
+def normalize_chunk_text(text):
+    """
+    Reduce chunk text to what its summary depends on, so the same section copied
+    into several articles gets the same key: image tags lose their number and src
+    (the images are keyed by content instead) and whitespace is collapsed.
+    """
+    text = re.sub(IMAGE_TAG_PATTERN, '<Image>', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def summary_cache_key(text, images_path, model=SUMMARY_MODEL, prompt=SUMMARY_PROMPT):
+    """
+    Build the cache key of a summary request.
+    The key doesn't depend on which article a chunk comes from, so boilerplate
+    sections (compliance statements, package contents, safety notes) repeated
+    across articles are summarized once.
+
+    Args:
+        text (str): Text containing image tags to summarize
+        images_path (str or dict): Folder the images are in, or image file name -> path
+        model (str): Model the summary is requested from
+        prompt (dict): Prompt the summary is requested with
 
-def create_gpt_summary(text, images_path):
+    Returns:
+        str: Hex sha256 of the model, prompt, normalized chunk text, the bytes of every
+             referenced image and the image preprocessing settings
+    """
+    image_hashes = [file_sha256(resolve_image_path(images_path, os.path.basename(match.group(2))))
+                    for match in re.finditer(IMAGE_TAG_PATTERN, text)]
+    vision_settings = [VISION_IMAGE_MAX_EDGE, VISION_IMAGE_FORMAT, VISION_IMAGE_QUALITY]
+    payload = json.dumps([model, prompt, normalize_chunk_text(text), image_hashes, vision_settings,
+                          "relative image numbers"], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def chunk_summary_key(text, images_path, mode=SUMMARY_MODE):
+    """Return the summary cache key create_gpt_summary uses for text in the given mode."""
+    if mode == "captions":
+        return summary_cache_key(text, images_path, model=[COMPOSE_MODEL, CAPTION_MODEL, CAPTION_PROMPT],
+                                 prompt=COMPOSE_PROMPT)
+    return summary_cache_key(text, images_path)
+
+def create_gpt_summary(text, images_path, mode=SUMMARY_MODE, key=None):
     """
     Create a summary of the given text using the Gemini model.
+    Results are kept in the summary cache, so an unchanged chunk (same normalized
+    text, images, prompt and model) is only summarized once, whichever article it
+    appears in. Identical chunks requested concurrently wait for the first request.
+    Image numbers are cached relative to the chunk and mapped back to the numbers of
+    the chunk being summarized, so a summary reused by another article refers to that
+    article's images.
+
+    In "captions" mode every image is captioned separately (see create_image_caption)
+    and the summary is written from the text and captions by a text-only request.
     
     Args:
         text (str): Text containing image tags to summarize
+        images_path (str or dict): Folder the images are in, or image file name -> path
+        mode (str): "vision" or "captions", see SUMMARY_MODE
+        key (str, optional): chunk_summary_key of text, if the caller already has it
         
     Returns:
         str: Generated summary from Gemini model
     """
+    if key is None:
+        key = chunk_summary_key(text, images_path, mode)
+    request = compose_gpt_summary if mode == "captions" else request_gpt_summary
+    numbers = [match.group(1) for match in re.finditer(IMAGE_TAG_PATTERN, text)]
+    summary = cached_request(key, relative_summary, request, text, images_path, numbers)
+    return absolute_image_numbers(summary, numbers)
+
+def relative_summary(request, text, images_path, numbers):
+    """Request a summary and rewrite its image numbers relative to the chunk."""
+    return relative_image_numbers(request(text, images_path), numbers)
+
+def relative_image_numbers(summary, numbers):
+    """
+    Replace the image numbers of the chunk (numbers, in tag order) in summary
+    with their position, e.g. "Image 12" -> "Image <#1>" when <Image12> is the first tag.
+    """
+    if not summary or not numbers:
+        return summary
+    positions = {}
+    for position, number in enumerate(numbers, start=1):
+        positions.setdefault(number, position)
+
+    def replace_numbers(match):
+        listed = re.sub(r'\d+', lambda n: f"<#{positions[n.group(0)]}>" if n.group(0) in positions else n.group(0),
+                        match.group(2))
+        return match.group(1) + listed
+
+    return re.sub(IMAGE_REFERENCE_PATTERN, replace_numbers, summary)
+
+def absolute_image_numbers(summary, numbers):
+    """Inverse of relative_image_numbers for the chunk being summarized."""
+    if not summary:
+        return summary
+    return re.sub(RELATIVE_IMAGE_PATTERN,
+                  lambda match: numbers[int(match.group(1)) - 1] if int(match.group(1)) <= len(numbers) else match.group(0),
+                  summary)
+
+def create_image_caption(image_path):
+    """
+    Describe one image, cached by the image contents, caption prompt and model
+    so a screenshot used in many articles is only described once.
+    """
+    vision_settings = [VISION_IMAGE_MAX_EDGE, VISION_IMAGE_FORMAT, VISION_IMAGE_QUALITY]
+    payload = json.dumps(["caption", CAPTION_MODEL, CAPTION_PROMPT, file_sha256(image_path), vision_settings],
+                         sort_keys=True)
+    key = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return cached_request(key, request_image_caption, image_path)
+
+def cached_request(key, request, *args):
+    """
+    Return the cached result of a model request, or make it with request(*args)
+    and cache it. Concurrent calls with the same key wait for the first one.
+    """
+    cache = get_summary_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached.decode('utf-8')
+
+    with _pending_requests_lock:
+        pending = _pending_requests.get(key)
+        if pending is None:
+            future = _pending_requests[key] = Future()
+    if pending is not None:
+        return pending.result()
+
+    try:
+        result = request(*args)
+        if result is not None:
+            cache.set(key, result.encode('utf-8'))
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _pending_requests_lock:
+            del _pending_requests[key]
+
+def request_gpt_summary(text, images_path):
+    """Ask the model for the summary of a chunk, without going through the cache."""
     # Create content list from text
     contents = create_content_list(text, images_path)
     # Add the prompt as the first element in contents list
     contents.insert(0, SUMMARY_PROMPT)
     
     response = client.chat.completions.create(
-    model="gpt-4.1",
+    model=SUMMARY_MODEL,
     messages=[{
                 "role": "user",
                 "content": contents,
@@ -35,6 +197,66 @@ def create_gpt_summary(text, images_path):
     )
     return response.choices[0].message.content
 
+def request_image_caption(image_path):
+    """Ask the caption model to describe one image, without going through the cache."""
+    mime_type, image_data = prepare_vision_image(image_path)
+    base64_image = base64.b64encode(image_data).decode('utf-8')
+    response = client.chat.completions.create(
+    model=CAPTION_MODEL,
+    messages=[{
+                "role": "user",
+                "content": [CAPTION_PROMPT, {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}}],
+            }
+        ],
+    temperature=0,
+    )
+    return response.choices[0].message.content
+
+def compose_gpt_summary(text, images_path):
+    """
+    Caption the images of a chunk in parallel, then ask the compose model for the
+    summary of the text with every image tag replaced by its caption.
+    """
+    matches = list(re.finditer(IMAGE_TAG_PATTERN, text))
+    caption_futures = [
+        caption_executor.submit(create_image_caption, resolve_image_path(images_path, os.path.basename(match.group(2))))
+        for match in matches
+    ]
+    try:
+        captions = [future.result() for future in caption_futures]
+    finally:
+        for future in caption_futures:
+            future.cancel()
+
+    # Rebuild the text with "Image N: caption" in place of every tag
+    parts = []
+    last_end = 0
+    for match, caption in zip(matches, captions):
+        parts.append(text[last_end:match.start()])
+        parts.append(f"Image {match.group(1)}: {(caption or '').strip()}")
+        last_end = match.end()
+    parts.append(text[last_end:])
+    captioned_text = "".join(parts).strip()
+    if not captioned_text:
+        return ""
+
+    response = client.chat.completions.create(
+    model=COMPOSE_MODEL,
+    messages=[{
+                "role": "user",
+                "content": [COMPOSE_PROMPT, {"type": "text", "text": captioned_text}],
+            }
+        ],
+    temperature=0,
+    )
+    return response.choices[0].message.content
+
+def resolve_image_path(images_path, filename):
+    # images_path is either the images folder or a file name -> path dict (ArticleBundle.images)
+    if isinstance(images_path, dict):
+        return images_path[filename]
+    return os.path.join(images_path, filename)
+
 def encode_image_to_base64(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
@@ -47,6 +269,7 @@ def create_content_list(text, images_path):
 
     Args:
         text (str): Text containing image tags in the format <ImageN src="path">
+        images_path (str or dict): Folder the images are in, or image file name -> path
 
     Returns:
         list: List of dictionaries, each representing a text or image part.
@@ -54,7 +277,7 @@ def create_content_list(text, images_path):
     """
     contents = []
     # Pattern to match image tags with numbers and capture the number and path
-    pattern = r'<Image(\d+) src="([^"]+)">'
+    pattern = IMAGE_TAG_PATTERN
 
     # Find all image tags in the text
     matches = list(re.finditer(pattern, text))
@@ -79,13 +302,15 @@ def create_content_list(text, images_path):
 
         filename = os.path.basename(image_path)
                     
-        full_path = os.path.join(images_path, filename)
-        base64_image = encode_image_to_base64(full_path)
+        full_path = resolve_image_path(images_path, filename)
+        # Downscaled and re-encoded, labelled with its real format
+        mime_type, image_data = prepare_vision_image(full_path)
+        base64_image = base64.b64encode(image_data).decode('utf-8')
         # Add the image number text before the image data
         contents.append({"type": "text", "text": f"Image {image_number}: "})
 
         # Add the image using the image_url schema
-        contents.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}})
+        contents.append({"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}})
 
         last_end = match.end()
 
@@ -1,5 +1,8 @@
 import os
 import time
+import hashlib
+import json
+import threading
 
 from pinecone import ServerlessSpec
 from pinecone.grpc import PineconeGRPC
@@ -8,21 +11,56 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 
 # from config import HOSTS
-from src.utils import get_manual_title, get_chapter_title
-from src.config import HOSTS
+from src.utils import load_article_context
+from src.config import HOSTS, PINECONE_BATCH_SIZE, EMBED_BATCH_SIZE
+from src.config import EMBEDDING_MODEL, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES
+from src.disk_cache import DiskCache
 
 pc = PineconeGRPC(api_key=os.environ.get("PINECONE_API_KEY"))
-langchain_embed_model = OpenAIEmbeddings(model="text-embedding-ada-002", openai_api_key=os.environ.get("OPENAI_API_KEY"))
+langchain_embed_model = OpenAIEmbeddings(model=EMBEDDING_MODEL, openai_api_key=os.environ.get("OPENAI_API_KEY"))
 
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
 
-def remove_article_pinecone(article_id, software=False, article_dir=None):
+
+def get_embedding_cache():
+    """Return the on-disk cache of summary embeddings, creating it on first use."""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = DiskCache(EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES)
+    return _embedding_cache
+
+
+def embed_texts(texts):
+    """
+    Embed texts, reusing the embedding of any text already embedded by an earlier
+    article or run. Repeated texts are only sent to the API once.
+
+    Returns:
+        list: One vector per text, in order.
+    """
+    cache = get_embedding_cache()
+    keys = [hashlib.sha256(f"{EMBEDDING_MODEL}\n{text}".encode('utf-8')).hexdigest() for text in texts]
+    vectors = {key: cache.get_json(key) for key in set(keys)}
+    missing = {key: text for key, text in zip(keys, texts) if vectors[key] is None}
+    if missing:
+        embedded = langchain_embed_model.embed_documents(list(missing.values()))
+        for key, vector in zip(missing, embedded):
+            cache.set_json(key, vector)
+            vectors[key] = vector
+    return [vectors[key] for key in keys]
+
+
+def remove_article_pinecone(article_id, software=False, article_dir=None, context=None):
     try:
+        context = context or load_article_context(article_id, article_dir)
         if software:
-            namespace = get_manual_title(article_id, article_dir).strip()
+            namespace = context.manual_title.strip()
             index_name = HOSTS[1][1]
             index = create_index(index_name=index_name)
         else:
-            namespace = get_chapter_title(article_id, article_dir)
+            namespace = context.chapter_title
             index_name = HOSTS[0][1]
             index = create_index(index_name=index_name)
 
@@ -43,20 +81,21 @@ def remove_article_pinecone(article_id, software=False, article_dir=None):
         print(f"Error removing article {article_id} from Pinecone: {e}")
         return False
 
-def send_docs_to_pinecone(documents, article_id, software=False):
+def send_docs_to_pinecone(documents, article_id, software=False, article_dir=None, context=None):
 
     if not documents:
         print("No documents to process.")
         return
     
+    context = context or load_article_context(article_id, article_dir)
     if software:
-        manual_title = get_manual_title(article_id)
+        manual_title = context.manual_title
         namespace = manual_title.strip()
         index_name = HOSTS[1][1] 
         index_host = HOSTS[1][0]  
         create_index(index_name=index_name)
     else:
-        chapter_title = get_chapter_title(article_id)
+        chapter_title = context.chapter_title
         namespace = chapter_title
         index_name = HOSTS[0][1]
         index_host = HOSTS[0][0]
@@ -74,6 +113,158 @@ def send_docs_to_pinecone(documents, article_id, software=False):
     return vectorstore_from_docs
 
 
+def article_index(software=False, context=None):
+    """Return the index, namespace and index name an article's vectors live in."""
+    if software:
+        namespace = context.manual_title.strip()
+        index_name = HOSTS[1][1]
+    else:
+        namespace = context.chapter_title
+        index_name = HOSTS[0][1]
+    return create_index(index_name=index_name), namespace, index_name
+
+
+def fetch_article_vectors(article_id, software=False, article_dir=None, context=None):
+    """
+    Fetch the vectors currently stored for an article.
+
+    Returns:
+        dict: Vector id -> (values, metadata), empty if the article has no vectors yet.
+    """
+    context = context or load_article_context(article_id, article_dir)
+    index, namespace, _ = article_index(software, context)
+
+    ids = list_article_ids(article_id, software=software, context=context)
+
+    vectors = {}
+    for start in range(0, len(ids), PINECONE_BATCH_SIZE):
+        response = index.fetch(ids=ids[start:start + PINECONE_BATCH_SIZE], namespace=namespace)
+        for vector_id, vector in response.vectors.items():
+            vectors[vector_id] = (list(vector.values), dict(vector.metadata or {}))
+    return vectors
+
+
+def previous_summaries(stored_vectors):
+    """
+    Map (original_text, summary_key) of each stored chunk to the summary it was embedded as.
+    Vectors stored without a summary key can't be matched and are summarized again.
+    """
+    return {
+        (metadata["original_text"], metadata["summary_key"]): metadata["text"]
+        for _, metadata in stored_vectors.values()
+        if isinstance(metadata.get("original_text"), str) and isinstance(metadata.get("summary_key"), str)
+        and "text" in metadata
+    }
+
+
+def document_vector_id(article_id, metadata, used_ids):
+    """
+    Derive a vector id from a document's content and metadata, so a chunk keeps its
+    id when sections are inserted or removed around it. Repeats within the article
+    get a numbered suffix.
+    """
+    digest = hashlib.sha256(json.dumps(metadata, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    vector_id = f"{article_id}-{digest}"
+    n = 1
+    while vector_id in used_ids:
+        n += 1
+        vector_id = f"{article_id}-{digest}-{n}"
+    used_ids.add(vector_id)
+    return vector_id
+
+
+def list_article_ids(article_id, software=False, article_dir=None, context=None):
+    """Return the ids of the vectors currently stored for an article."""
+    context = context or load_article_context(article_id, article_dir)
+    index, namespace, _ = article_index(software, context)
+    ids = []
+    for page in index.list(prefix=f"{article_id}-", namespace=namespace):
+        ids.extend(page)
+    return ids
+
+
+def sync_docs_to_pinecone(documents, article_id, stored_vectors=None, software=False, article_dir=None, context=None,
+                          batch_size=EMBED_BATCH_SIZE, failures=None):
+    """
+    Bring an article's vectors in line with documents, touching only what changed.
+
+    documents can be a generator (load_documents(stream=True)); they are embedded and
+    upserted batch_size at a time as they arrive, so embedding overlaps summarization.
+    Vector ids are derived from the document contents (see document_vector_id), so
+    documents already stored are skipped, documents whose summary matches a stored
+    vector reuse its embedding, and only the remaining ones are embedded. Stored ids
+    that no document maps to any more are deleted once every document has been upserted.
+
+    Args:
+        documents (iterable): Documents as returned by load_documents.
+        article_id (str): Article the documents belong to.
+        stored_vectors (dict, optional): Current vectors, as returned by fetch_article_vectors.
+            None re-embeds every document and only reads the stored ids to delete stale ones.
+        failures (list, optional): The failures list given to load_documents. If it isn't
+            empty once documents is exhausted the article is incomplete, so nothing is deleted.
+
+    Returns:
+        dict: Number of unchanged, reused, embedded and deleted vectors, None if there were no documents.
+    """
+    context = context or load_article_context(article_id, article_dir)
+    index, namespace, index_name = article_index(software, context)
+    print(f"Syncing article {article_id} with index: {index_name} in namespace: {namespace}")
+
+    if stored_vectors is None:
+        stored_ids = list_article_ids(article_id, software=software, context=context)
+        stored_vectors = {}
+    else:
+        stored_ids = list(stored_vectors)
+    embeddings_by_text = {metadata.get("text"): values for values, metadata in stored_vectors.values()}
+
+    stats = {"unchanged": 0, "reused": 0, "embedded": 0, "deleted": 0}
+    upserts = []
+    to_embed = []
+
+    def flush():
+        if to_embed:
+            values = embed_texts([metadata["text"] for _, metadata in to_embed])
+            upserts.extend((vector_id, vector, metadata) for (vector_id, metadata), vector in zip(to_embed, values))
+            stats["embedded"] += len(to_embed)
+            to_embed.clear()
+        for start in range(0, len(upserts), PINECONE_BATCH_SIZE):
+            index.upsert(vectors=upserts[start:start + PINECONE_BATCH_SIZE], namespace=namespace)
+        upserts.clear()
+
+    current_ids = set()
+    for doc in documents:
+        metadata = {**doc.metadata, "text": doc.page_content}
+        vector_id = document_vector_id(article_id, metadata, current_ids)
+        stored = stored_vectors.get(vector_id)
+        if stored is not None and stored[1] == metadata:
+            stats["unchanged"] += 1
+        elif doc.page_content in embeddings_by_text:
+            upserts.append((vector_id, embeddings_by_text[doc.page_content], metadata))
+            stats["reused"] += 1
+        else:
+            to_embed.append((vector_id, metadata))
+        if len(to_embed) + len(upserts) >= batch_size:
+            flush()
+    flush()
+
+    if not current_ids:
+        print("No documents to process.")
+        return None
+
+    if failures:
+        print(f"Article {article_id} stopped early, keeping its other stored vectors")
+        return stats
+
+    stale_ids = [vector_id for vector_id in stored_ids if vector_id not in current_ids]
+    for start in range(0, len(stale_ids), PINECONE_BATCH_SIZE):
+        index.delete(ids=stale_ids[start:start + PINECONE_BATCH_SIZE], namespace=namespace)
+    stats["deleted"] = len(stale_ids)
+
+    print(f"Article {article_id}: {stats['unchanged']} unchanged, {stats['reused']} re-used embeddings, "
+          f"{stats['embedded']} embedded, {stats['deleted']} deleted")
+    return stats
+
+
 def create_index(index_name, dimension=1536, metric="cosine"):
     # Remove pc initialization since it's global
     existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
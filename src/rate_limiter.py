@@ -0,0 +1,148 @@
+"""
+Process-wide adaptive rate limiter for the ScreenSteps API.
+A token bucket paces every worker; when the API answers 429 the bucket learns
+the allowed rate, pauses all callers until retry_in has passed and then ramps
+back up to just below the learned limit.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+from src.config import (
+    RATE_LIMIT_INITIAL_RATE,
+    RATE_LIMIT_MIN_RATE,
+    RATE_LIMIT_MAX_RATE,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_RAMP_STEP,
+    RATE_LIMIT_SAFETY,
+)
+
+# Window (seconds) over which the request rate is observed when a 429 arrives
+OBSERVATION_WINDOW = 60.0
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket shared by every thread (and coroutine) talking to the API.
+
+    Args:
+        rate (float): Initial requests per second.
+        min_rate (float): Lowest rate the limiter backs off to.
+        max_rate (float): Highest rate the limiter ramps up to.
+        burst (int): Bucket capacity.
+        ramp_step (float): Requests per second added after each successful call.
+        safety (float): Fraction of the learned limit to stay under.
+    """
+
+    def __init__(self, rate=RATE_LIMIT_INITIAL_RATE, min_rate=RATE_LIMIT_MIN_RATE,
+                 max_rate=RATE_LIMIT_MAX_RATE, burst=RATE_LIMIT_BURST,
+                 ramp_step=RATE_LIMIT_RAMP_STEP, safety=RATE_LIMIT_SAFETY):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = burst
+        self.ramp_step = ramp_step
+        self.safety = safety
+        self.learned_limit = None
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        # Bumped on every 429, so callers can tell their reserved slot predates a pause
+        self.pauses = 0
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self):
+        """
+        Take one token and return how long the caller has to wait before sending.
+
+        Returns:
+            float: Seconds to wait (0 when the request may go out immediately).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(0.0, self.updated - now) + max(0.0, -self.tokens) / self.rate
+            send_at = now + wait
+            self._sent.append(send_at)
+            while self._sent and self._sent[0] < send_at - OBSERVATION_WINDOW:
+                self._sent.popleft()
+            return wait
+
+    def pause_remaining(self):
+        """Seconds left on the current 429 pause (0 when not paused)."""
+        with self._lock:
+            return max(0.0, self.paused_until - time.monotonic())
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            pauses = self.pauses
+            wait = self.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            if self.pauses == pauses:
+                return
+            # A 429 paused everyone while we were waiting for our slot, which was
+            # scheduled at the old rate: queue again at the learned one
+
+    async def acquire_async(self):
+        """Coroutine counterpart of acquire, for the asyncio exporter."""
+        while True:
+            pauses = self.pauses
+            wait = self.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if self.pauses == pauses:
+                return
+
+    def on_success(self):
+        """Ramp back up after a successful request, staying under the learned limit."""
+        with self._lock:
+            ceiling = self.max_rate
+            if self.learned_limit is not None:
+                ceiling = min(ceiling, self.learned_limit * self.safety)
+            self.rate = max(self.rate, min(ceiling, self.rate + self.ramp_step))
+
+    def on_rate_limited(self, retry_in):
+        """
+        Record a 429 response and pause every caller for retry_in seconds.
+
+        Args:
+            retry_in (float): Seconds the API asked us to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            resume_at = now + retry_in
+            self.pauses += 1
+            if now < self.paused_until:
+                # Another worker already reported this limit, just honour the longer wait
+                self.paused_until = max(self.paused_until, resume_at)
+                self.updated = max(self.updated, self.paused_until)
+                return
+
+            sent = [t for t in self._sent if now - OBSERVATION_WINDOW <= t <= now]
+            observed = len(sent) / max(1.0, now - sent[0]) if sent else 0.0
+            self.learned_limit = max(self.min_rate, observed if observed > 0 else self.rate)
+            self.rate = max(self.min_rate, min(self.rate, self.learned_limit * self.safety) / 2)
+
+            # Drain the bucket so nobody bursts the moment the pause ends
+            self.paused_until = resume_at
+            self.tokens = 0.0
+            self.updated = resume_at
+            self._sent.clear()
+
+
+_limiter = AdaptiveRateLimiter()
+
+
+def get_rate_limiter():
+    """Return the limiter shared by every ScreenSteps client in the process."""
+    return _limiter
@@ -0,0 +1,554 @@
+"""
+ScreenSteps API client shared by the exporter.
+Every request goes through one keep-alive requests.Session so connections to
+<site>.screenstepslive.com and to the image CDN are reused between calls.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.config import (
+    SCREENSTEPS_TIMEOUT,
+    SCREENSTEPS_API_POOL_SIZE,
+    SCREENSTEPS_ASSET_POOL_SIZE,
+    SCREENSTEPS_POOL_HOSTS,
+    ASSET_DOWNLOAD_WORKERS,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_RETRY_BACKOFF,
+    ASSET_MAX_BYTES,
+    RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL,
+)
+from src.asset_store import get_asset_store
+from src.disk_cache import DiskCache
+from src.rate_limiter import get_rate_limiter
+
+_session = None
+_session_lock = threading.Lock()
+_response_cache = None
+_partial_locks = {}
+# URLs being fetched into the asset store, so concurrent callers share one download
+_pending_assets = {}
+
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (?:(\d+)-\d+|\*)/(\d+|\*)')
+
+
+class DownloadError(Exception):
+    """
+    Raised when a download fails or comes back incomplete.
+
+    Args:
+        message (str): What went wrong.
+        retryable (bool, optional): Whether trying again may succeed.
+        restart (bool, optional): Whether the partial file is unusable and has to be thrown away.
+    """
+
+    def __init__(self, message, retryable=True, restart=False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.restart = restart
+
+
+def get_session():
+    """
+    Return the process-wide pooled session, creating it on first use.
+
+    Returns:
+        requests.Session: Session with keep-alive connection pools for every host.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            # Default adapter is used for the asset CDN hosts
+            adapter = HTTPAdapter(pool_connections=SCREENSTEPS_POOL_HOSTS,
+                                  pool_maxsize=SCREENSTEPS_ASSET_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def get_response_cache():
+    """Return the on-disk cache of ScreenSteps API responses, creating it on first use."""
+    global _response_cache
+    with _session_lock:
+        if _response_cache is None:
+            _response_cache = DiskCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_BYTES)
+    return _response_cache
+
+
+def mount_api_host(session, base_url, pool_size=SCREENSTEPS_API_POOL_SIZE):
+    """Give the ScreenSteps API host its own connection pool on the session."""
+    with _session_lock:
+        if base_url not in session.adapters:
+            session.mount(base_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+
+class ScreenStepsClient:
+    """
+    Thin client for the ScreenSteps v2 API.
+
+    Args:
+        site_name (str): The name of the site (account name)
+        user_id (str): User ID for authentication
+        api_token (str): API token or password for authentication
+        timeout (float or tuple, optional): Request timeout passed to requests.
+        session (requests.Session, optional): Session to use. Defaults to the shared pool.
+        limiter (AdaptiveRateLimiter, optional): Rate limiter. Defaults to the process-wide one.
+        cache (DiskCache, optional): Response cache for get_cached_text. Defaults to the shared one.
+    """
+
+    def __init__(self, site_name, user_id, api_token, timeout=SCREENSTEPS_TIMEOUT, session=None, limiter=None,
+                 cache=None):
+        self.base_url = 'https://' + site_name + '.screenstepslive.com/api/v2/'
+        self.auth = (user_id, api_token)
+        self.timeout = timeout
+        self.session = session or get_session()
+        self.limiter = limiter or get_rate_limiter()
+        self.cache = cache or get_response_cache()
+        mount_api_host(self.session, 'https://' + site_name + '.screenstepslive.com/')
+
+    def get_text(self, endpoint):
+        """
+        Fetch an API endpoint and return the raw response body.
+
+        Args:
+            endpoint (str): Endpoint relative to the API root, e.g. "sites/123".
+
+        Returns:
+            str: The response text, or None if the request failed.
+        """
+        r = self._get(endpoint)
+        return r.text if r is not None else None
+
+    def get_cached_text(self, endpoint, ttl=RESPONSE_CACHE_TTL):
+        """
+        Fetch an API endpoint through the on-disk response cache.
+        Entries younger than ttl are returned without a request; older ones are
+        revalidated with If-None-Match / If-Modified-Since so an unchanged
+        resource only costs a 304.
+
+        Args:
+            endpoint (str): Endpoint relative to the API root, e.g. "sites/123".
+            ttl (float, optional): Seconds a cached response is used without revalidation.
+
+        Returns:
+            str: The response text, or None if the request failed.
+        """
+        key = response_cache_key(self.auth[0], self.base_url + endpoint)
+        entry = self.cache.get_json(key)
+        if is_fresh(entry, ttl):
+            return entry['body']
+
+        r = self._get(endpoint, headers=revalidation_headers(entry))
+        if r is None:
+            return None
+        return update_cached_response(self.cache, key, entry, r.status_code, r.text, r.headers)
+
+    def _get(self, endpoint, headers=None):
+        """Send a rate-limited GET, returning the 200/304 response or None on failure."""
+        site_endpoint = self.base_url + endpoint
+        try:
+            while True:
+                self.limiter.acquire()
+                r = self.session.get(site_endpoint, auth=self.auth, headers=headers, timeout=self.timeout)
+
+                if r.status_code in (200, 304):
+                    self.limiter.on_success()
+                    return r
+                elif r.status_code == 429:
+                    # Rate limit exceeded, pause every worker sharing the limiter
+                    retry_in = parse_retry_in(r.text)
+                    print(f"Rate limit exceeded. Pausing requests for {retry_in} seconds...")
+                    self.limiter.on_rate_limited(retry_in)
+                else:
+                    print(f'Error connecting to server ({r.status_code})')
+                    return None
+        except requests.exceptions.RequestException as e:
+            print("Error connecting to server:", e)
+            return None
+
+
+def response_cache_key(user_id, url):
+    """Return the response cache key of an API URL fetched as user_id."""
+    return user_id + ' ' + url
+
+
+def is_fresh(entry, ttl):
+    """Return True if a cached response entry can be used without revalidating it."""
+    return bool(entry) and time.time() - entry['fetched_at'] < ttl
+
+
+def revalidation_headers(entry):
+    """Return the conditional request headers that revalidate a cached response entry."""
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def update_cached_response(cache, key, entry, status, body, headers):
+    """
+    Store the outcome of a (conditional) request in the response cache.
+    A 304 refreshes the existing entry; anything else replaces it.
+
+    Returns:
+        str: The current response body.
+    """
+    if status == 304 and entry:
+        entry['fetched_at'] = time.time()
+    else:
+        entry = {
+            'body': body,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+        }
+    cache.set_json(key, entry)
+    return entry['body']
+
+
+def parse_retry_in(body):
+    """
+    Read the retry_in hint from the body of a 429 response.
+
+    Returns:
+        float: Seconds to wait, 60 if the body can't be parsed.
+    """
+    try:
+        return float(json.loads(body).get('retry_in', 60))  # Default to 60 seconds if not provided
+    except (ValueError, TypeError, AttributeError):
+        # Failed to parse JSON, fall back to a default wait time
+        return 60.0
+
+
+def download_file(directory, url, session=None, timeout=SCREENSTEPS_TIMEOUT, retries=DOWNLOAD_RETRIES,
+                  max_bytes=ASSET_MAX_BYTES):
+    """
+    Stream a file into directory using the shared session.
+    The body is written to a ".part" file next to the target and renamed into
+    place once its size matches Content-Length, so a dropped connection never
+    leaves a truncated file behind. Interrupted downloads are resumed with an
+    HTTP Range request, both on retry and on the next run; the resume is made
+    conditional with If-Range on the first response's ETag or Last-Modified, so
+    a file that changed on the server is downloaded again instead of spliced
+    onto the old bytes. Files bigger than
+    max_bytes are refused as soon as the response headers announce their size.
+
+    Returns:
+        str: The file name the download was saved under.
+    """
+    session = session or get_session()
+    short_path = url_file_name(url)
+    local_filename = os.path.join(directory, short_path)
+    partial_filename = partial_path(directory, short_path)
+    with partial_lock(partial_filename):
+        for attempt in range(retries + 1):
+            try:
+                _download_range(session, url, partial_filename, timeout, max_bytes)
+                os.replace(partial_filename, local_filename)
+                discard_partial(partial_filename, keep_body=True)
+                return short_path
+            except (requests.exceptions.RequestException, DownloadError) as e:
+                if isinstance(e, DownloadError) and (e.restart or not e.retryable):
+                    discard_partial(partial_filename)
+                if (isinstance(e, DownloadError) and not e.retryable) or attempt == retries:
+                    raise
+                wait = DOWNLOAD_RETRY_BACKOFF * 2 ** attempt
+                print(f"Download of {url} interrupted ({e}), resuming in {wait} seconds...")
+                time.sleep(wait)
+
+
+def _download_range(session, url, partial_filename, timeout, max_bytes=None):
+    """Fetch whatever is missing from partial_filename, raising DownloadError if it's still incomplete."""
+    offset, headers = resume_headers(partial_filename)
+    with session.get(url, stream=True, timeout=timeout, headers=headers) as r:
+        expected = expected_size(r.status_code, r.headers, offset)
+        check_limit(expected, max_bytes)
+        if expected == offset and r.status_code == 416:
+            # The partial file already holds the whole body
+            return
+        mode = 'ab' if r.status_code == 206 else 'wb'
+        if mode == 'wb':
+            save_validator(partial_filename, r.headers)
+        with open(partial_filename, mode) as f:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    check_limit(f.tell(), max_bytes)
+    check_size(partial_filename, expected)
+
+
+def expected_size(status, headers, offset):
+    """
+    Validate a download response and work out how big the finished file should be.
+
+    Args:
+        status (int): HTTP status code.
+        headers (Mapping): Response headers.
+        offset (int): Bytes already on disk that were asked to be skipped with Range.
+
+    Returns:
+        int: Expected size of the complete file, or None if the server didn't say.
+    """
+    content_range = CONTENT_RANGE_PATTERN.match(headers.get('Content-Range', ''))
+    total = content_range.group(2) if content_range else None
+    total = int(total) if total and total != '*' else None
+    length = headers.get('Content-Length')
+    length = int(length) if length and length.isdigit() else None
+    if headers.get('Content-Encoding', 'identity') != 'identity':
+        # Content-Length counts the encoded bytes, not what ends up on disk
+        length = None
+    if status == 206:
+        if content_range is None or content_range.group(1) is None or int(content_range.group(1)) != offset:
+            raise DownloadError("Server resumed at the wrong offset", restart=True)
+        return total if total is not None else (offset + length if length is not None else None)
+    if status == 416 and offset:
+        if total == offset:
+            return total
+        raise DownloadError("Partial file doesn't match the server copy", restart=True)
+    if status == 200:
+        return length
+    raise DownloadError(f"HTTP {status}", retryable=status == 429 or status >= 500)
+
+
+def check_size(path, expected):
+    """Raise DownloadError unless the file at path is exactly expected bytes (when known)."""
+    if expected is None:
+        return
+    size = os.path.getsize(path)
+    if size < expected:
+        raise DownloadError(f"Incomplete download ({size} of {expected} bytes)")
+    if size > expected:
+        raise DownloadError(f"Download larger than Content-Length ({size} of {expected} bytes)", restart=True)
+
+
+def check_limit(size, max_bytes):
+    """Raise a non-retryable DownloadError if size is known and over max_bytes."""
+    if max_bytes is not None and size is not None and size > max_bytes:
+        raise DownloadError(f"File is larger than the {max_bytes} byte limit", retryable=False)
+
+
+def partial_path(directory, short_path):
+    """Return the file an unfinished download of short_path is kept in."""
+    return os.path.join(directory, '.' + short_path + '.part')
+
+
+def validator_path(partial_filename):
+    """Return the file the validator (ETag or Last-Modified) of a partial download is kept in."""
+    return partial_filename + '.validator'
+
+
+def save_validator(partial_filename, headers):
+    """
+    Remember the validator of the response a partial download was started from.
+    Only strong ETags can be used with If-Range; without one, Last-Modified is kept,
+    and without either the partial file won't be resumed.
+    """
+    etag = headers.get('ETag')
+    validator = etag if etag and not etag.startswith('W/') else headers.get('Last-Modified')
+    path = validator_path(partial_filename)
+    if validator:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(validator)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def resume_headers(partial_filename):
+    """
+    Work out how to continue a partial download.
+    A partial file without a saved validator can't be checked against the server
+    copy, so it's discarded and the download starts over.
+
+    Returns:
+        tuple: (offset, request headers or None)
+    """
+    offset = os.path.getsize(partial_filename) if os.path.exists(partial_filename) else 0
+    if not offset:
+        return 0, None
+    try:
+        with open(validator_path(partial_filename), 'r', encoding='utf-8') as f:
+            validator = f.read().strip()
+    except OSError:
+        validator = None
+    if not validator:
+        discard_partial(partial_filename)
+        return 0, None
+    return offset, {'Range': f'bytes={offset}-', 'If-Range': validator}
+
+
+def discard_partial(partial_filename, keep_body=False):
+    """Delete a partial download and its validator (only the validator with keep_body)."""
+    paths = [validator_path(partial_filename)] if keep_body else [partial_filename, validator_path(partial_filename)]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def partial_lock(path):
+    """Return the lock serialising downloads into the same partial file."""
+    with _session_lock:
+        return _partial_locks.setdefault(path, threading.Lock())
+
+
+def fetch_assets(urls, workers=ASSET_DOWNLOAD_WORKERS, session=None, store=None, max_bytes=ASSET_MAX_BYTES):
+    """
+    Make sure a batch of URLs is in the content-addressed asset store.
+    URLs the store already has are not downloaded; the others are fetched
+    concurrently into the store's staging area and added to it.
+
+    Args:
+        urls (iterable): URLs to fetch.
+        workers (int, optional): Number of parallel downloads.
+        session (requests.Session, optional): Session to use. Defaults to the shared pool.
+        store (AssetStore, optional): Asset store to use. Defaults to the shared one.
+        max_bytes (int, optional): Files larger than this are skipped. None for no limit.
+
+    Returns:
+        dict: Maps each successful URL to the path of its blob in the store.
+    """
+    store = store or get_asset_store()
+
+    def fetch(url):
+        source = store.lookup(url)
+        if source is not None:
+            return source
+        # Another article may be fetching the same URL right now, wait for it instead
+        with _session_lock:
+            pending = _pending_assets.get(url)
+            if pending is None:
+                future = _pending_assets[url] = Future()
+        if pending is not None:
+            return pending.result()
+        try:
+            # It may also have finished between the lookup and taking over the URL
+            source = store.lookup(url)
+            if source is None:
+                staging = store.staging_dir(url)
+                staged = os.path.join(staging, download_file(staging, url, session=session, max_bytes=max_bytes))
+                source = store_staged_file(store, url, staged)
+            future.set_result(source)
+            return source
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _session_lock:
+                del _pending_assets[url]
+
+    blobs = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(fetch, url): url for url in dict.fromkeys(urls)}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                blobs[url] = future.result()
+            except Exception as e:
+                print(f"Error downloading {url}: {e}")
+    return blobs
+
+
+def store_staged_file(store, url, staged):
+    """
+    Add a finished download to the asset store and clean up its staging folder.
+    Only the caller that owns the URL's download (see fetch_assets) may call this,
+    so nobody else is using the staging folder when it's removed.
+
+    Returns:
+        str: Path of the blob in the store.
+    """
+    source = store.add_file(url, staged)
+    os.remove(staged)
+    try:
+        os.rmdir(os.path.dirname(staged))
+    except OSError:
+        pass
+    return source
+
+
+def download_files(jobs, workers=ASSET_DOWNLOAD_WORKERS, session=None, store=None, max_bytes=ASSET_MAX_BYTES):
+    """
+    Download a batch of files concurrently.
+    Each URL is fetched once and kept in the content-addressed asset store; every
+    directory that wants it gets a hardlink (or copy) of the stored blob. URLs
+    already in the store are not downloaded at all.
+
+    Args:
+        jobs (iterable): (directory, url) pairs.
+        workers (int, optional): Number of parallel downloads.
+        session (requests.Session, optional): Session to use. Defaults to the shared pool.
+        store (AssetStore, optional): Asset store to use. Defaults to the shared one.
+        max_bytes (int, optional): Files larger than this are skipped. None for no limit.
+
+    Returns:
+        dict: Maps each successful (directory, url) pair to the saved file name.
+    """
+    targets = {}
+    for directory, url in jobs:
+        directories = targets.setdefault(url, [])
+        if directory not in directories:
+            directories.append(directory)
+
+    blobs = fetch_assets(targets, workers=workers, session=session, store=store, max_bytes=max_bytes)
+    return link_assets(targets, blobs)
+
+
+def link_assets(targets, blobs):
+    """
+    Link stored blobs into the directories that asked for them.
+
+    Args:
+        targets (dict): url -> list of directories.
+        blobs (dict): url -> blob path, as returned by fetch_assets.
+
+    Returns:
+        dict: Maps each successful (directory, url) pair to the saved file name.
+    """
+    downloaded = {}
+    for url, source in blobs.items():
+        file_name = url_file_name(url)
+        for directory in targets[url]:
+            try:
+                link_or_copy(source, os.path.join(directory, file_name))
+            except OSError as e:
+                print(f"Error saving {url} to {directory}: {e}")
+                continue
+            downloaded[(directory, url)] = file_name
+    return downloaded
+
+
+def url_file_name(url):
+    """Return the file name a URL is saved under (last path segment, no query string)."""
+    return url.split('/')[-1].split('?')[0]
+
+
+def link_or_copy(source, destination):
+    """
+    Hardlink source to destination, falling back to a copy across filesystems.
+    The link is made under a temporary name and renamed into place, so workers
+    linking the same file into a shared folder at once can't trip over each other.
+    """
+    temp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
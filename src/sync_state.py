@@ -0,0 +1,83 @@
+"""
+Local record of which article versions have already been pushed downstream.
+Maps article id -> last_edited_at and a hash of the article content so
+incremental runs can skip articles that haven't changed.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from src.config import SYNC_STATE_PATH
+
+
+def article_content_hash(article_data):
+    """
+    Hash the parts of an article that feed the downstream stages.
+
+    Args:
+        article_data (dict): The article as returned by the ScreenSteps API.
+
+    Returns:
+        str: Hex sha256 of the manual and chapter ids (they pick the Pinecone namespace
+             and the chapter/manual metadata), title, HTML body and asset URLs.
+    """
+    article = article_data['article']
+    payload = json.dumps([
+        article.get('manual_id'),
+        article.get('chapter_id'),
+        article.get('title'),
+        article.get('html_body'),
+        [block.get('url') for block in article.get('content_blocks', []) if 'url' in block],
+    ], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SyncState:
+    """
+    JSON-backed store of the last synced version of each article.
+
+    Args:
+        path (str, optional): Location of the state file.
+    """
+
+    def __init__(self, path=SYNC_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.articles = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.articles = json.load(f).get('articles', {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read sync state {path}, starting fresh: {e}")
+
+    def is_unchanged(self, article_id, last_edited_at, content_hash):
+        """Return True if this exact article version has already been synced."""
+        with self._lock:
+            entry = self.articles.get(str(article_id))
+        return (entry is not None
+                and entry.get('last_edited_at') == last_edited_at
+                and entry.get('content_hash') == content_hash)
+
+    def mark_synced(self, article_id, last_edited_at, content_hash):
+        """Record a successfully processed article version and persist the state."""
+        with self._lock:
+            self.articles[str(article_id)] = {
+                'last_edited_at': last_edited_at,
+                'content_hash': content_hash,
+            }
+            self._save()
+
+    def forget(self, article_id):
+        """Drop an article so the next incremental run processes it again."""
+        with self._lock:
+            if self.articles.pop(str(article_id), None) is not None:
+                self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'articles': self.articles}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -1,12 +1,25 @@
 from bs4 import BeautifulSoup
 import os
 from tqdm import tqdm
-from markdownify import markdownify
+from markdownify import markdownify, MarkdownConverter
+
+MARKDOWN_OPTIONS = dict(heading_style="ATX", strip="a", escape_underscores=False)
 
 def tag_and_markdown(html_file_path, output_file_path=None, debug=False):
+    # Parse the article once and write the tagged markdown straight from that tree;
+    # the .html file is left untouched
     try:
-        add_tags(html_file_path)
-        html_to_markdown(html_file_path, html_file_path.replace('.html', '.md'))
+        with open(html_file_path, 'r', encoding='utf-8') as file:
+            html_content = file.read()
+
+        article_id = os.path.basename(html_file_path).split('.')[0]
+        markdown_content = html_to_tagged_markdown(html_content, article_id)
+
+        output_file = html_file_path.replace('.html', '.md')
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(markdown_content)
+
+        print(f"Markdown content has been saved to {output_file}")
     except Exception as e:
         print(f"Error tag and markdown for {html_file_path}: {str(e)}")
         return f"Error: {str(e)}"
@@ -16,7 +29,7 @@ def html_to_markdown(file_path, output_file):
         with open(file_path, 'r', encoding='utf-8') as file:
                 html_content = file.read()
 
-        markdown_content = markdownify(html_content, heading_style="ATX", strip="a", escape_underscores=False)
+        markdown_content = markdownify(html_content, **MARKDOWN_OPTIONS)
 
         # # Save to a file
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -59,6 +72,19 @@ def extract_filename(src):
         print("No recognized extension")
     return base + extension
 
+def html_to_tagged_markdown(html_content, article_id, debug=False):
+    # Same output as add_tags followed by html_to_markdown, from a single parse.
+    # html.parser is kept on purpose: other parsers repair markup differently and
+    # would change the markdown
+    soup = BeautifulSoup(html_content, 'html.parser')
+    replace_img_tags(soup, article_id, f"{article_id}.html", debug=debug)
+
+    # The re-parse in html_to_markdown merged each image tag with the text around it,
+    # markdownify's whitespace handling depends on that
+    soup.smooth()
+
+    return MarkdownConverter(**MARKDOWN_OPTIONS).convert_soup(soup)
+
 def add_tags(html_file_path, output_file_path=None, debug=False):
     # Read the HTML file
     with open(html_file_path, 'r', encoding='utf-8') as file:
@@ -67,14 +93,25 @@ def add_tags(html_file_path, output_file_path=None, debug=False):
     # Create BeautifulSoup object
     soup = BeautifulSoup(html_content, 'html.parser')
 
+    article_id = os.path.basename(html_file_path).split('.')[0]
+    replace_img_tags(soup, article_id, os.path.basename(html_file_path), debug=debug)
+
+    # If no output path specified, modify the original file
+    if output_file_path is None:
+        output_file_path = html_file_path
+
+    # Write the modified HTML to file
+    with open(output_file_path, 'w', encoding='utf-8') as file:
+        file.write(str(soup))
+
+    return
+
+def replace_img_tags(soup, article_id, file_name, debug=False):
     # Find all img tags
     img_tags = soup.find_all('img')
     
     # Replace each img tag with text
-    progress_caption = tqdm(img_tags, desc=f"Replacing images with tags in article: {os.path.basename(html_file_path)}", unit="image", colour='cyan', leave=False)
-
-    
-    article_id = os.path.basename(html_file_path).split('.')[0]
+    progress_caption = tqdm(img_tags, desc=f"Replacing images with tags in article: {file_name}", unit="image", colour='cyan', leave=False)
 
     n = 1
     for img in img_tags:
@@ -91,14 +128,6 @@ def add_tags(html_file_path, output_file_path=None, debug=False):
         img.replace_with(new_tag)
         progress_caption.update(1)
         n += 1
-    # If no output path specified, modify the original file
-    if output_file_path is None:
-        output_file_path = html_file_path
-
-    # Write the modified HTML to file
-    with open(output_file_path, 'w', encoding='utf-8') as file:
-        file.write(str(soup))
 
     progress_caption.close()
-    return
 
@@ -0,0 +1,60 @@
+"""
+Precompiled handlebar templates for the ScreenSteps exporter.
+A template is split into literal text and {{name}} placeholders once; rendering
+is then a single join over the parts, and placeholder values that are callables
+are only evaluated if the template actually uses them.
+"""
+import re
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{(\w+)\}\}')
+
+
+class CompiledTemplate:
+    """
+    Template text parsed into literal and placeholder parts.
+
+    Args:
+        text (str): Template source using {{name}} placeholders.
+    """
+    __slots__ = ('parts', 'names')
+
+    def __init__(self, text):
+        # Even indexes hold literal text, odd indexes hold placeholder names
+        parts = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            parts.append(text[position:match.start()])
+            parts.append(match.group(1))
+            position = match.end()
+        parts.append(text[position:])
+        self.parts = parts
+        self.names = frozenset(parts[1::2])
+
+    def uses(self, name):
+        """Return True if the template contains {{name}}."""
+        return name in self.names
+
+    def render(self, values):
+        """
+        Render the template in one pass.
+        Placeholders missing from values are left in the output untouched.
+
+        Args:
+            values (dict): Placeholder name -> str, or a callable returning the str.
+
+        Returns:
+            str: The rendered text.
+        """
+        resolved = {}
+        output = []
+        for index, part in enumerate(self.parts):
+            if index % 2 == 0:
+                output.append(part)
+            elif part in values:
+                if part not in resolved:
+                    value = values[part]
+                    resolved[part] = value() if callable(value) else value
+                output.append(resolved[part])
+            else:
+                output.append('{{' + part + '}}')
+        return ''.join(output)
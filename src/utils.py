@@ -1,13 +1,94 @@
 import json
 import os
+import threading
 
-def is_software(article_id, article_dir=None):
-    if get_manual_title(article_id, article_dir) == "Device manuals":
-        return False
-    elif get_manual_title(article_id, article_dir) == "Knowledge base and FAQ":
-        return False
-    else:
+SOFTWARE_EXCLUDED_MANUALS = ("Device manuals", "Knowledge base and FAQ")
+
+# path -> ((mtime_ns, size), ArticleContext)
+_context_cache = {}
+_context_lock = threading.Lock()
+
+class ArticleContext:
+    """
+    The site/manual/chapter/article metadata of one article, parsed once.
+
+    Args:
+        metadata (dict): The article metadata, as saved in {article_id}.json.
+    """
+    __slots__ = ('site_id', 'site_title', 'manual_id', 'manual_title', 'chapter_id', 'chapter_title',
+                 'article_id', 'article_title', 'last_edited_at', 'content_hash')
+
+    def __init__(self, metadata):
+        site = metadata.get('site') or {}
+        manual = metadata.get('manual') or {}
+        chapter = metadata.get('chapter') or {}
+        article = metadata.get('article') or {}
+        set_field = object.__setattr__
+        set_field(self, 'site_id', site.get('id'))
+        set_field(self, 'site_title', site.get('title'))
+        set_field(self, 'manual_id', manual.get('id'))
+        set_field(self, 'manual_title', manual.get('title'))
+        set_field(self, 'chapter_id', chapter.get('id'))
+        set_field(self, 'chapter_title', chapter.get('title'))
+        set_field(self, 'article_id', article.get('id'))
+        set_field(self, 'article_title', article.get('title'))
+        set_field(self, 'last_edited_at', article.get('last_edited_at'))
+        set_field(self, 'content_hash', article.get('content_hash'))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ArticleContext is read-only")
+
+    @property
+    def software(self):
+        """True if the article belongs to a software manual."""
+        return self.manual_title not in SOFTWARE_EXCLUDED_MANUALS
+
+def metadata_path(article_id, article_dir=None):
+    """Return the path of {article_id}.json, in article_dir or the default temp directory."""
+    if article_dir:
+        return os.path.join(article_dir, f"{article_id}.json")
+    current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(current_dir, f"temp/{article_id}/{article_id}.json")
+
+def load_article_context(article_id, article_dir=None):
+    """
+    Load the ArticleContext of an article.
+    The parsed file is memoized by path and modification time, so repeated
+    lookups for the same article don't open the JSON again.
+    
+    Args:
+        article_id (str): The ID of the article.
+        article_dir (str, optional): Directory path where the article is stored.
+                                     If None, uses default temp directory.
+    
+    Returns:
+        ArticleContext: The article context or None if the file doesn't exist.
+    """
+    json_file_path = metadata_path(article_id, article_dir)
+    try:
+        stat = os.stat(json_file_path)
+    except OSError:
+        print(f"Metadata file for article {article_id} does not exist at {json_file_path}.")
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with _context_lock:
+        cached = _context_cache.get(json_file_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    with open(json_file_path, 'r', encoding='utf-8') as f:
+        context = ArticleContext(json.load(f))
+    with _context_lock:
+        _context_cache[json_file_path] = (stamp, context)
+    return context
+
+def is_software(article_id, article_dir=None, context=None):
+    context = context or load_article_context(article_id, article_dir)
+    if context is None:
+        # Same as a missing manual title before
         return True
+    return context.software
 
 def get_meta_man_title(manual_id, manual_dir):
     """
@@ -41,11 +122,7 @@ def get_metadata(article_id, article_dir=None):
     Returns:
         dict: The article metadata as a dictionary or None if the file doesn't exist.
     """
-    if article_dir:
-        json_file_path = os.path.join(article_dir, f"{article_id}.json")
-    else:
-        current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        json_file_path = os.path.join(current_dir, f"temp/{article_id}/{article_id}.json")
+    json_file_path = metadata_path(article_id, article_dir)
     
     if not os.path.exists(json_file_path):
         print(f"Metadata file for article {article_id} does not exist at {json_file_path}.")
@@ -54,117 +131,110 @@ def get_metadata(article_id, article_dir=None):
     with open(json_file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def get_site_title(article_id, article_dir=None):
+def get_site_title(article_id, article_dir=None, context=None):
     """
     Get the site title for a given article ID.
     
     Args:
         article_id (str): The ID of the article.
         article_dir (str, optional): Directory path where the article is stored.
+        context (ArticleContext, optional): Already loaded context (e.g. ArticleBundle.context).
     
     Returns:
         str: The site title or None if not found.
     """
-    metadata = get_metadata(article_id, article_dir)
-    if metadata and 'site' in metadata and 'title' in metadata['site']:
-        return metadata['site']['title']
-    return None
+    context = context or load_article_context(article_id, article_dir)
+    return context.site_title if context else None
 
-def get_manual_title(article_id, article_dir=None):
+def get_manual_title(article_id, article_dir=None, context=None):
     """
     Get the manual title for a given article ID.
     
     Args:
         article_id (str): The ID of the article.
         article_dir (str, optional): Directory path where the article is stored.
+        context (ArticleContext, optional): Already loaded context (e.g. ArticleBundle.context).
     
     Returns:
         str: The manual title or None if not found.
     """
-    metadata = get_metadata(article_id, article_dir)
-    if metadata and 'manual' in metadata and 'title' in metadata['manual']:
-        return metadata['manual']['title']
-    return None
+    context = context or load_article_context(article_id, article_dir)
+    return context.manual_title if context else None
 
-def get_chapter_title(article_id, article_dir=None):
+def get_chapter_title(article_id, article_dir=None, context=None):
     """
     Get the chapter title for a given article ID.
     
     Args:
         article_id (str): The ID of the article.
         article_dir (str, optional): Directory path where the article is stored.
+        context (ArticleContext, optional): Already loaded context (e.g. ArticleBundle.context).
     
     Returns:
         str: The chapter title or None if not found.
     """
-    metadata = get_metadata(article_id, article_dir)
-    if metadata and 'chapter' in metadata and 'title' in metadata['chapter']:
-        return metadata['chapter']['title']
-    return None
+    context = context or load_article_context(article_id, article_dir)
+    return context.chapter_title if context else None
 
-def get_article_title(article_id, article_dir=None):
+def get_article_title(article_id, article_dir=None, context=None):
     """
     Get the article title for a given article ID.
     
     Args:
         article_id (str): The ID of the article.
         article_dir (str, optional): Directory path where the article is stored.
+        context (ArticleContext, optional): Already loaded context (e.g. ArticleBundle.context).
     
     Returns:
         str: The article title or None if not found.
     """
-    metadata = get_metadata(article_id, article_dir)
-    if metadata and 'article' in metadata and 'title' in metadata['article']:
-        return metadata['article']['title']
-    return None
+    context = context or load_article_context(article_id, article_dir)
+    return context.article_title if context else None
 
-def get_site_id(article_id, article_dir=None):
+def get_site_id(article_id, article_dir=None, context=None):
     """
     Get the site ID for a given article ID.
     
     Args:
         article_id (str): The ID of the article.
         article_dir (str, optional): Directory path where the article is stored.
+        context (ArticleContext, optional): Already loaded context (e.g. ArticleBundle.context).
     
     Returns:
         str: The site ID or None if not found.
     """
-    metadata = get_metadata(article_id, article_dir)
-    if metadata and 'site' in metadata and 'id' in metadata['site']:
-        return metadata['site']['id']
-    return None
+    context = context or load_article_context(article_id, article_dir)
+    return context.site_id if context else None
 
-def get_manual_id(article_id, article_dir=None):
+def get_manual_id(article_id, article_dir=None, context=None):
     """
     Get the manual ID for a given article ID.
     
     Args:
         article_id (str): The ID of the article.
         article_dir (str, optional): Directory path where the article is stored.
+        context (ArticleContext, optional): Already loaded context (e.g. ArticleBundle.context).
     
     Returns:
         int or str: The manual ID or None if not found.
     """
-    metadata = get_metadata(article_id, article_dir)
-    if metadata and 'manual' in metadata and 'id' in metadata['manual']:
-        return metadata['manual']['id']
-    return None
+    context = context or load_article_context(article_id, article_dir)
+    return context.manual_id if context else None
 
-def get_chapter_id(article_id, article_dir=None):
+def get_chapter_id(article_id, article_dir=None, context=None):
     """
     Get the chapter ID for a given article ID.
     
     Args:
         article_id (str): The ID of the article.
         article_dir (str, optional): Directory path where the article is stored.
+        context (ArticleContext, optional): Already loaded context (e.g. ArticleBundle.context).
     
     Returns:
         int or str: The chapter ID or None if not found.
     """
-    metadata = get_metadata(article_id, article_dir)
-    if metadata and 'chapter' in metadata and 'id' in metadata['chapter']:
-        return metadata['chapter']['id']
-    return None
+    context = context or load_article_context(article_id, article_dir)
+    return context.chapter_id if context else None
 
 if __name__ == "__main__":
     # Example usage
@@ -2,13 +2,19 @@
 
 import ssl
 import sys, getopt
-import requests
-import time
 import json
 import os, fnmatch
 import re
 import shutil
-from urllib.parse import urlparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import FETCH_PROFILES, BUNDLE_STAGING_DIR
+from src.article_bundle import ArticleBundle
+from src.screensteps_client import ScreenStepsClient, download_files, fetch_assets, link_or_copy, url_file_name
+from src.sync_state import article_content_hash
+from src.template_engine import CompiledTemplate
 
 # globals
 article_file_indicator = '@article.*'
@@ -46,6 +52,7 @@ def print_help():
     [-a <article_id>]
     [-M <manual_file_name]
     [-i object_identifier]
+    [-j <jobs>]
 
     Explanations:
     -n This is used for the name of the account (http://<account_name>.screenstepslive.com)
@@ -58,45 +65,161 @@ def print_help():
     -a If you'd like to only download one article, specify the ID here (optional)
     -M Pass in a specific name to use for the manual file. Must pass in the -m parameter.
     -i Specifies how the site, manual, and article files should be named. By default the "id" from ScreenSteps is used. You can set this to "title" or "title_id". "title_id" will use the name with " [ID]" appended to the end.
+    -j Number of chapters/articles to fetch in parallel (optional, default 1). Failed articles are reported at the end instead of stopping the export.
 
     Examples:
     run -n customerknowledge -u mikey -p mypassword -s 15226
     run -n myaccount -u johnsmith -p notAgoodPassword -a 21234
+    run -n customerknowledge -u mikey -p mypassword -t templates -j 8
     """)
 
+class ExportError(Exception):
+    """Raised when a ScreenSteps request made by the CLI export fails."""
+
 def make_dir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-def download_file(directory, url):
-    short_path = url.split('/')[-1].split('?')[0]
-    local_filename = os.path.join(directory, short_path)
-    r = requests.get(url, stream=True)
-    with open(local_filename, 'wb') as f:
-        for chunk in r.iter_content(chunk_size=1024):
-            if chunk:
-                f.write(chunk)
-    return short_path
-
-def find_file(pattern, path):
-    result = []
-    for root, dirs, files in os.walk(path):
-        for name in files:
-            if fnmatch.fnmatch(name, pattern):
-                result.append(os.path.join(root, name))
-    return result
-
-def find_dirs(pattern, path):
-    result = []
-    for root, dirs, files in os.walk(path):
-        for dirname in dirs:
-            if pattern in dirname.split():
-                result.append(os.path.join(root, dirname))
-    return result
-
-def get_article(site_name, user_id, api_token, site_id, article_id, output_folder="temp"):
+class TemplateIndex:
     """
-    Pull records from a specified article ID and save them to the output folder.
+    Every "@" marker of a template folder, found in a single os.walk.
+    Lists are in os.walk order.
+    """
+
+    def __init__(self, template_folder):
+        self.article_dirs = []
+        self.image_markers = []
+        self.attach_markers = []
+        self.article_files = []
+        self.manual_files = []
+        for root, dirs, files in os.walk(template_folder):
+            for dirname in dirs:
+                if "@article" in dirname.split():
+                    self.article_dirs.append(os.path.join(root, dirname))
+            for name in files:
+                path = os.path.join(root, name)
+                if fnmatch.fnmatch(name, image_folder_indicator):
+                    self.image_markers.append(path)
+                if fnmatch.fnmatch(name, attach_folder_indicator):
+                    self.attach_markers.append(path)
+                if fnmatch.fnmatch(name, article_file_indicator):
+                    self.article_files.append(path)
+                if fnmatch.fnmatch(name, manual_file_indicator):
+                    self.manual_files.append(path)
+
+def is_template_marker(name):
+    """True for the "@" files and @article folders that only exist to drive the export."""
+    return (fnmatch.fnmatch(name, article_file_indicator)
+            or fnmatch.fnmatch(name, manual_file_indicator)
+            or fnmatch.fnmatch(name, image_folder_indicator)
+            or fnmatch.fnmatch(name, attach_folder_indicator)
+            or "@article" in name.split())
+
+def collect_article_assets(article_data, images_folder, attachments_folder, profile="mirror"):
+    """
+    List the downloadable content blocks of an article that the fetch profile asks for.
+
+    Parameters:
+    article_data (dict): The article as returned by the ScreenSteps API
+    images_folder (str): Folder images are downloaded to
+    attachments_folder (str): Folder attachments are downloaded to
+    profile (str): Key of FETCH_PROFILES, "rag" skips attachments (default: "mirror")
+
+    Returns:
+    list: (content_block, directory, local_folder) tuples, in content block order
+    """
+    wanted = FETCH_PROFILES[profile]
+    assets = []
+    for content_block in article_data['article']['content_blocks']:
+        if 'url' in content_block:
+            if content_block['type'] == 'AttachmentContent':
+                asset = (content_block, attachments_folder, 'attachments')
+            else:
+                asset = (content_block, images_folder, 'images')
+            if asset[2] in wanted:
+                assets.append(asset)
+    return assets
+
+def rewrite_urls(text, url_map):
+    """
+    Replace every URL in url_map with its local path in a single scan of text.
+    Longer URLs are tried first, so a URL is never clobbered by one of its prefixes.
+
+    Parameters:
+    text (str): HTML (or any text) to rewrite
+    url_map (dict): URL -> replacement
+    """
+    if not url_map:
+        return text
+    pattern = re.compile('|'.join(re.escape(url) for url in sorted(url_map, key=len, reverse=True)))
+    return pattern.sub(lambda match: url_map[match.group(0)], text)
+
+def localize_article_html(article_html, assets, downloaded):
+    """
+    Point the article HTML at the downloaded copies of its assets.
+
+    Parameters:
+    article_html (str): The html_body of the article
+    assets (list): Tuples returned by collect_article_assets
+    downloaded (dict): (directory, url) -> file name, as returned by download_files
+    """
+    url_map = {}
+    for content_block, directory, local_folder in assets:
+        file_name = downloaded.get((directory, content_block['url']))
+        if file_name is None:
+            continue
+        # Update HTML to point to local file
+        url_map.setdefault(content_block['url'], f"{local_folder}/{file_name}")
+        if content_block['type'] != 'AttachmentContent':
+            # Handle thumbnails too
+            thumbnail_url = content_block['url'].replace("/original/", "/medium/")
+            url_map.setdefault(thumbnail_url, f"{local_folder}/{file_name}")
+    return rewrite_urls(article_html, url_map)
+
+def make_article_bundle(article_id, article_data, toc_data, assets, blobs):
+    """
+    Build the in-memory bundle of a fetched article.
+
+    Parameters:
+    article_id (str): The ID of the article
+    article_data (dict): The article as returned by the ScreenSteps API
+    toc_data (dict): Site/manual/chapter/article metadata of the article
+    assets (list): Tuples returned by collect_article_assets with the "images"/"attachments" folder names as directories
+    blobs (dict): URL -> downloaded file, as returned by fetch_assets
+
+    The blobs are hardlinked into a staging folder of the bundle, so other workers
+    evicting them from the asset store can't remove them while the article is being
+    processed. ArticleBundle.release() deletes the folder.
+    """
+    os.makedirs(BUNDLE_STAGING_DIR, exist_ok=True)
+    staging_folder = tempfile.mkdtemp(prefix=f"{article_id}-", dir=BUNDLE_STAGING_DIR)
+    downloaded = {}
+    images = {}
+    attachments = {}
+    for content_block, directory, local_folder in assets:
+        url = content_block['url']
+        if url in blobs:
+            file_name = url_file_name(url)
+            subfolder = 'attachments' if local_folder == 'attachments' else 'images'
+            destination = os.path.join(staging_folder, subfolder, file_name)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            try:
+                link_or_copy(blobs[url], destination)
+            except OSError as e:
+                print(f"Error staging {url} for article {article_id}: {e}")
+                continue
+            downloaded[(directory, url)] = file_name
+            files = attachments if subfolder == 'attachments' else images
+            files[file_name] = destination
+    article_html = localize_article_html(article_data['article']['html_body'], assets, downloaded)
+    bundle = ArticleBundle(article_id, toc_data, html=article_html, images=images, attachments=attachments)
+    bundle.staging_folder = staging_folder
+    return bundle
+
+def get_article_bundle(site_name, user_id, api_token, site_id, article_id, sync_state=None, profile="mirror"):
+    """
+    Pull an article, its TOC information and its images into memory.
+    Nothing is written outside the asset store; call save() on the bundle to get the article folder.
     
     Parameters:
     site_name (str): The name of the site (account name)
@@ -104,47 +227,17 @@ def get_article(site_name, user_id, api_token, site_id, article_id, output_folde
     api_token (str): API token or password for authentication
     site_id (str): The ID of the site containing the article
     article_id (str): The ID of the article to retrieve
-    output_folder (str): Folder to save the article data (default: "temp")
+    sync_state (SyncState): If given, articles already synced at this version are skipped (default: None)
+    profile (str): Fetch profile, "rag" downloads images only, "mirror" attachments too (default: "mirror")
     
     Returns:
-    dict: The article data with TOC information (IDs and names only)
+    ArticleBundle: The article, or None if a request failed. Skipped articles only
+    carry the "article" TOC entry and have unchanged set.
     """
-    def screensteps_json(endpoint):
-        base_url = 'https://' + site_name + '.screenstepslive.com/api/v2/'
-        site_endpoint = base_url + endpoint
-        try:
-            while True:
-                r = requests.get(site_endpoint, auth=(user_id, api_token))
-
-                if r.status_code == 200:
-                    return r.text
-                elif r.status_code == 429:
-                    # Rate limit exceeded
-                    try:
-                        retry_info = r.json()
-                        retry_in = retry_info.get('retry_in', 60)  # Default to 60 seconds if not provided
-                        print(f"Rate limit exceeded. Retrying in {retry_in} seconds...")
-                        time.sleep(retry_in)
-                    except ValueError:
-                        # Failed to parse JSON, fall back to a default wait time
-                        print("Rate limit exceeded. Retrying in 60 seconds (default)...")
-                        time.sleep(60)
-                else:
-                    print(f'Error connecting to server ({r.status_code})')
-                    return None
-        except requests.exceptions.RequestException as e:
-            print("Error connecting to server:", e)
-            return None
-            
-    # Create output folder structure
-    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), output_folder)
-    article_folder = os.path.join(output_path, article_id)
-    images_folder = os.path.join(article_folder, 'images')
-    attachments_folder = os.path.join(article_folder, 'attachments')
-    
-    # Create necessary directories
-    for directory in [output_path, article_folder, images_folder, attachments_folder]:
-        make_dir(directory)
+    client = ScreenStepsClient(site_name, user_id, api_token)
+    screensteps_json = client.get_text
+    # site/manual/chapter hierarchy rarely changes, serve it from the response cache
+    screensteps_hierarchy_json = client.get_cached_text
     
     # Get article data
     endpoint = 'sites/' + site_id + '/articles/' + article_id
@@ -153,11 +246,20 @@ def get_article(site_name, user_id, api_token, site_id, article_id, output_folde
         return None
     
     article_data = json.loads(raw_text)
+    article_version = {
+        "id": article_data['article']['id'],
+        "title": article_data['article']['title'],
+        "last_edited_at": article_data['article'].get('last_edited_at'),
+        "content_hash": article_content_hash(article_data)
+    }
+    if sync_state and sync_state.is_unchanged(article_id, article_version['last_edited_at'], article_version['content_hash']):
+        print(f"Article {article_id} is unchanged since the last sync, skipping.")
+        return ArticleBundle(article_id, {"article": article_version}, unchanged=True)
     
     # Build TOC information
     # First get site information
     site_endpoint = 'sites/' + site_id
-    site_raw_text = screensteps_json(site_endpoint)
+    site_raw_text = screensteps_hierarchy_json(site_endpoint)
     if not site_raw_text:
         return None
     
@@ -169,7 +271,7 @@ def get_article(site_name, user_id, api_token, site_id, article_id, output_folde
     
     # Get manual details
     manual_endpoint = 'sites/' + site_id + '/manuals/' + str(manual_id)
-    manual_raw_text = screensteps_json(manual_endpoint)
+    manual_raw_text = screensteps_hierarchy_json(manual_endpoint)
     if not manual_raw_text:
         return None
     
@@ -185,7 +287,7 @@ def get_article(site_name, user_id, api_token, site_id, article_id, output_folde
     if not chapter_info:
         # If we didn't find the chapter in the manual, try getting it directly
         chapter_endpoint = 'sites/' + site_id + '/chapters/' + str(chapter_id)
-        chapter_raw_text = screensteps_json(chapter_endpoint)
+        chapter_raw_text = screensteps_hierarchy_json(chapter_endpoint)
         if chapter_raw_text:
             chapter_info = json.loads(chapter_raw_text)['chapter']
     
@@ -203,43 +305,44 @@ def get_article(site_name, user_id, api_token, site_id, article_id, output_folde
             "id": chapter_id,
             "title": chapter_info['title'] if chapter_info else "Unknown Chapter"
         },
-        "article": {
-            "id": article_data['article']['id'],
-            "title": article_data['article']['title']
-        }
+        "article": article_version
     }
     
-    # Save the simplified JSON data
-    with open(os.path.join(article_folder, f"{article_id}.json"), 'w', encoding='utf-8') as f:
-        json.dump(toc_data, f, indent=2)
+    # Download attachments and images into the asset store, then point the HTML at them
+    assets = collect_article_assets(article_data, 'images', 'attachments', profile)
+    blobs = fetch_assets(content_block['url'] for content_block, _, _ in assets)
+    return make_article_bundle(article_id, article_data, toc_data, assets, blobs)
+
+def get_article(site_name, user_id, api_token, site_id, article_id, output_folder="temp", sync_state=None, profile="mirror"):
+    """
+    Pull records from a specified article ID and save them to the output folder.
     
-    # Extract and save HTML content
-    article_html = article_data['article']['html_body']
+    Parameters:
+    site_name (str): The name of the site (account name)
+    user_id (str): User ID for authentication
+    api_token (str): API token or password for authentication
+    site_id (str): The ID of the site containing the article
+    article_id (str): The ID of the article to retrieve
+    output_folder (str): Folder to save the article data (default: "temp")
+    sync_state (SyncState): If given, articles already synced at this version are skipped (default: None)
+    profile (str): Fetch profile, "rag" downloads images only, "mirror" attachments too (default: "mirror")
     
-    # Process attachments and images
-    for content_block in article_data['article']['content_blocks']:
-        if 'url' in content_block:
-            if content_block['type'] == 'AttachmentContent':
-                # Download attachment
-                download_file(attachments_folder, content_block['url'])
-                # Update HTML to point to local file
-                file_name = content_block['url'].split('/')[-1].split('?')[0]
-                article_html = article_html.replace(content_block['url'], f"attachments/{file_name}")
-            else:
-                # Download image
-                file_name = download_file(images_folder, content_block['url'])
-                # Update HTML to point to local file
-                article_html = article_html.replace(content_block['url'], f"images/{file_name}")
-                # Handle thumbnails too
-                thumbnail_url = content_block['url'].replace("/original/", "/medium/")
-                article_html = article_html.replace(thumbnail_url, f"images/{file_name}")
+    Returns:
+    dict: The article data with TOC information (IDs and names only). Skipped
+    articles only carry the "article" entry and "unchanged": True.
+    """
+    bundle = get_article_bundle(site_name, user_id, api_token, site_id, article_id, sync_state=sync_state, profile=profile)
+    if bundle is None:
+        return None
+    if bundle.unchanged:
+        return {"article": bundle.toc['article'], "unchanged": True}
+
+    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), output_folder)
+    article_folder = bundle.save(os.path.join(output_path, article_id))
+    bundle.release()
     
-    # Save the HTML
-    with open(os.path.join(article_folder, f"{article_id}.html"), 'w', encoding='utf-8') as f:
-        f.write(article_html)
-        
     print(f"Article saved to {article_folder} with the requested structure")
-    return toc_data
+    return bundle.toc
 
 def split_path(path):
     allparts = []
@@ -274,27 +377,21 @@ def find_at_file_path(thispath,template_folder):
     relative_path = remove_list_overlap(split_path(thispath),split_path(template_folder))
     return os.path.join(*relative_path)
 
-def remove_directory(directory):
-    if os.path.exists(directory):
-        shutil.rmtree(directory)
-
-def remove_directories(directories):
-    for directory in directories:
-        remove_directory(directory)
-
-def remove_found_files(files):
-    for name in files:
-        if os.path.exists(name):
-            os.remove(name)
-
 def write_file(directory, name, rawtext):
-    with open(os.path.join(directory, name), 'wb+') as f:
+    # write a new file and rename it into place so a file hardlinked from the
+    # template folder is replaced rather than modified
+    path = os.path.join(directory, name)
+    with open(path + '.tmp', 'wb+') as f:
         f.write(rawtext.encode('utf-8'))
+    os.replace(path + '.tmp', path)
 
 def copy_and_overwrite(from_path, to_path):
+    # hardlink the template instead of copying it, and leave the "@" markers
+    # out so they don't have to be searched for and deleted afterwards
     if os.path.exists(to_path):
         shutil.rmtree(to_path)
-    shutil.copytree(from_path, to_path)
+    shutil.copytree(from_path, to_path, copy_function=link_or_copy,
+                    ignore=lambda directory, names: [name for name in names if is_template_marker(name)])
 
 def read_file(path):
     with open(path) as f:
@@ -311,6 +408,18 @@ def prepare_for_filename(string):
 def _print(var):
     return var
 
+def article_template_values(this_article):
+    """
+    Build the handlebar values for an article.
+    Values are callables so they are only computed (and {{json}} only
+    serialized) when a template actually uses them.
+    """
+    values = {}
+    for article_handlebar in article_handlebars:
+        values[article_handlebar] = lambda name=article_handlebar: _decode(this_article['article'][name])
+    values['json'] = lambda: json.dumps(this_article, sort_keys=True, indent=2, separators=(',', ': '))
+    return values
+
 def main(argv):
     # Define variables we need.
     site_name = '' #n / site_name
@@ -323,8 +432,9 @@ def main(argv):
     article_id = ''#a / article
     manual_file_name = ''#M / manual_file_name
     object_identifier = 'id'#i / object_identifier
+    jobs = 1#j / jobs
     try:
-        opts, args = getopt.getopt(argv,"hn:u:p:t:o:s:m:a:M:i:",["site_name=","user_id=","password=","template_folder=","output_folder=","site_id=","manual_id=","article_id=","manual_file_name=","object_identifier="])
+        opts, args = getopt.getopt(argv,"hn:u:p:t:o:s:m:a:M:i:j:",["site_name=","user_id=","password=","template_folder=","output_folder=","site_id=","manual_id=","article_id=","manual_file_name=","object_identifier=","jobs="])
     except getopt.GetoptError:
         print('use "run.py -h" for help')
         sys.exit(2)
@@ -353,6 +463,12 @@ def main(argv):
                 manual_file_name = arg
         elif opt in ("-i", "--object_identifier"):
             object_identifier = arg
+        elif opt in ("-j", "--jobs"):
+            try:
+                jobs = max(1, int(arg))
+            except ValueError:
+                print('-j expects a number of parallel requests, use "run.py -h" for help')
+                sys.exit(2)
 
 
     # check if required attributes exist
@@ -377,9 +493,10 @@ def main(argv):
         # check if template folder exists
         if os.path.exists(template_folder):
             template_specified = True
+            template_index = TemplateIndex(template_folder)
 
             # check if folder has an @article folder
-            at_article_folder = find_dirs("@article",template_folder)
+            at_article_folder = template_index.article_dirs
 
             if len(at_article_folder) == 0:
                 print("Info: No @article folder found.")
@@ -393,7 +510,7 @@ def main(argv):
                 sys.exit()
 
             # check if folder has an @images folder
-            at_images_folder = find_file(image_folder_indicator,template_folder)
+            at_images_folder = template_index.image_markers
 
             if len(at_images_folder) == 0:
                 print("Info: No " + image_folder_indicator + " file found.")
@@ -407,7 +524,7 @@ def main(argv):
                 sys.exit()
 
             # check if folder has an @attachments folder
-            at_attach_folder = find_file(attach_folder_indicator,template_folder)
+            at_attach_folder = template_index.attach_markers
 
             if len(at_attach_folder) == 0:
                 print("Info: No " + attach_folder_indicator + " file found.")
@@ -422,7 +539,7 @@ def main(argv):
 
             # now let's see if there are @article file(s). we'll take as many
             # as you want, as long as there is at least one!
-            at_article_file = find_file(article_file_indicator,template_folder)
+            at_article_file = template_index.article_files
 
             if at_article_file == []:
                 print("Error: No @article file found.")
@@ -435,10 +552,10 @@ def main(argv):
                 # read in template data
                 article_files = {}
                 for each_article_file in at_article_file:
-                    article_files[each_article_file] = read_file(each_article_file)
+                    article_files[each_article_file] = CompiledTemplate(read_file(each_article_file))
 
             # now let's check if theres a manual file
-            at_manual_file = find_file(manual_file_indicator,template_folder)
+            at_manual_file = template_index.manual_files
 
             if at_manual_file == []:
                 print("Warn: No @toc file found.")
@@ -470,11 +587,11 @@ def main(argv):
                         add_end_manual_file = ''
 
                     manual_files_ref[each_manual_file] = [
-                                                chapter_split[0], # 0 - pre-chapter
-                                                article_split[0], # 1 - pre-article (chapter)
-                                                article_split[1], # 2 - article
-                                                article_split[2], # 3 - post-article (chapter)
-                                                chapter_split[2]] # 4 - post-chapter
+                                                CompiledTemplate(chapter_split[0]), # 0 - pre-chapter
+                                                CompiledTemplate(article_split[0]), # 1 - pre-article (chapter)
+                                                CompiledTemplate(article_split[1]), # 2 - article
+                                                CompiledTemplate(article_split[2]), # 3 - post-article (chapter)
+                                                CompiledTemplate(chapter_split[2])] # 4 - post-chapter
 
         # template folder didn't exist
         else:
@@ -482,40 +599,147 @@ def main(argv):
             sys.exit()
 
     # set up request
-    def screensteps_json(endpoint):
-        base_url = 'https://' + site_name + '.screenstepslive.com/api/v2/'
-        site_endpoint = base_url + endpoint
-        try:
-            while True:
-                r = requests.get(site_endpoint, auth=(user_id, api_token))
-
-                if r.status_code == 200:
-                    return r.text
-                elif r.status_code == 429:
-                    # Rate limit exceeded
-                    try:
-                        retry_info = r.json()
-                        retry_in = retry_info.get('retry_in', 60)  # Default to 60 seconds if not provided
-                        print(f"Rate limit exceeded. Retrying in {retry_in} seconds...")
-                        time.sleep(retry_in)
-                    except ValueError:
-                        # Failed to parse JSON, fall back to a default wait time
-                        print("Rate limit exceeded. Retrying in 60 seconds (default)...")
-                        time.sleep(60)
-                else:
-                    print('Error connecting to server (' + _decode(r.status_code) + ')')
-                    sys.exit(2)
-        except requests.exceptions.RequestException as e:
-            print("Error connecting to server:", e)
-            sys.exit(2)
-
-    def screensteps(endpoint):
-        rawtext = screensteps_json(endpoint)
+    client = ScreenStepsClient(site_name, user_id, api_token)
+    failures = []
+
+    def screensteps(endpoint, cached=False):
+        if cached:
+            rawtext = client.get_cached_text(endpoint)
+        else:
+            rawtext = client.get_text(endpoint)
+        if rawtext is None:
+            raise ExportError("Could not fetch " + endpoint)
         return json.loads(rawtext)
 
+    identifier_locks = {}
+    identifier_locks_lock = threading.Lock()
+
+    def identifier_lock(identifier):
+        """Return the lock serialising writes to the output of one article identifier."""
+        with identifier_locks_lock:
+            return identifier_locks.setdefault(identifier, threading.Lock())
+
+    def export_article(this_site_id, site_folder, article):
+        """
+        Fetch one article, download its files and write its article file(s).
+        Runs on the crawl workers, so output is written as soon as the article arrives.
+
+        Returns:
+        tuple: (this_article, this_article_identifier, article_files_paths, article_values)
+        """
+        this_article_id = _decode(article['id'])
+        print(">>>>> Processing article: " + _print(article['title']))
+        # print(">>>>> " + _print(article))
+
+        this_article = screensteps('sites/' + this_site_id + '/articles/' + this_article_id) # grab ind article
+
+        this_article_title = this_article['article']['title']
+
+        if object_identifier == "title_id":
+            this_article_identifier = prepare_for_filename(this_article_title) + " [" + this_article_id + "]"
+        elif object_identifier == "title":
+            this_article_identifier = prepare_for_filename(this_article_title)
+        else:
+            this_article_identifier = this_article_id
+
+        # Two articles can map to the same folder (same title with -i title, or one article
+        # listed in two chapters); their rmtree/copy/write must not interleave
+        with identifier_lock(this_article_identifier):
+            if is_article_folder:
+                article_folder = os.path.join(site_folder, find_relative_path(at_article_folder,template_folder), this_article_identifier)
+                copy_and_overwrite(at_article_folder, article_folder)
+            else:
+                # write html to a file if no templates
+                article_folder = site_folder
+
+            article_html = this_article['article']['html_body']
+
+            # loop through attached files
+            article_downloads = []
+            for content_block in this_article['article']['content_blocks']:
+                if 'url' in content_block:
+
+                    # what type of file is it?
+                    if content_block['type'] == 'AttachmentContent': # attachment
+                        if is_attach_folder:
+                            files_folder = os.path.join(site_folder,at_attach_folder)
+                            short_files_folder = at_attach_folder
+                            if '@article' in files_folder:
+                                files_folder = files_folder.replace("@article", this_article_identifier)
+                                short_files_folder = short_files_folder.replace("@article", this_article_identifier)
+                        else:
+                            files_folder = os.path.join(article_folder, 'attachments')
+                            short_files_folder = 'attachments'
+                            make_dir(files_folder)
+                    else: # image
+                        if is_image_folder:
+                            files_folder = os.path.join(site_folder,at_images_folder)
+                            short_files_folder = at_images_folder
+                            if '@article' in files_folder:
+                                files_folder = files_folder.replace("@article", this_article_identifier)
+                                short_files_folder = short_files_folder.replace("@article", this_article_identifier)
+                        else:
+                            files_folder = os.path.join(article_folder, 'images')
+                            short_files_folder = 'images'
+                            make_dir(files_folder)
+
+                    print(">>>>>> Processing " + _print(content_block['type']) + ": " + _print(content_block['url']))
+                    article_downloads.append((content_block['url'], files_folder, short_files_folder))
+
+            downloaded = download_files((files_folder, url) for url, files_folder, _ in article_downloads)
+            this_articles_files = []
+            for url, files_folder, short_files_folder in article_downloads:
+                if (files_folder, url) in downloaded:
+                    this_articles_files.append([ _decode(url), os.path.join(short_files_folder,downloaded[(files_folder, url)])])
+
+            article_files_paths = []
+            article_values = article_template_values(this_article)
+            article_values['html'] = article_html
+            if template_specified:
+                # step through each file that starts with "@article"
+                for path, temp_html in article_files.items():
+
+                    back_dir = ''
+                    article_relative_path = find_relative_path(path,template_folder)
+                    temp_filename = this_article_identifier + os.path.splitext(path)[1]
+                    if article_relative_path != '':
+                        article_relative_path = article_relative_path.replace("@article", this_article_identifier)
+                        temp_filename = os.path.join(article_relative_path,temp_filename)
+                        back_dir = '../' * len(split_path(article_relative_path))
+
+                    # fill in {{html}}, {{json}} and the other handlebars in one pass
+                    temp_towrite = temp_html.render(article_values)
+
+                    url_map = {}
+                    for this_articles_file in this_articles_files:
+                        # take off any query params
+                        image_url = this_articles_file[0].split("?", 1)[0]
+                        local_path = back_dir + this_articles_file[1].replace("\\", "/") # Fix windows paths
+                        url_map.setdefault(image_url, local_path)
+                        # workaround: perform replace on thumbnail images
+                        url_map.setdefault(image_url.replace("/original/", "/medium/"), local_path)
+                    temp_towrite = rewrite_urls(temp_towrite, url_map)
+
+                    # write file
+                    write_file(site_folder, temp_filename, temp_towrite)
+                    article_files_paths.append(temp_filename)
+            else:
+                url_map = {}
+                for this_articles_file in this_articles_files:
+                    url_map.setdefault(this_articles_file[0], this_articles_file[1].replace("\\", "/")) # Fix windows paths
+                article_html = rewrite_urls(article_html, url_map)
+                write_file(article_folder, (this_article_identifier + '.html'), article_html)
+                article_files_paths.append((this_article_identifier + '.html'))
+
+            return this_article, this_article_identifier, article_files_paths, article_values
+
     # grab all sites for that user information
     print("> Pulling sites")
-    sites = screensteps('sites') # grab sites
+    try:
+        sites = screensteps('sites', cached=True) # grab sites
+    except ExportError as e:
+        print("Error: " + str(e))
+        sys.exit(2)
     print("> " + _print(str(sites)))
 
     # loop through sites
@@ -538,7 +762,11 @@ def main(argv):
             else:
                 make_dir(site_folder)
 
-            manuals = screensteps('sites/' + this_site_id) #grab manuals
+            try:
+                manuals = screensteps('sites/' + this_site_id, cached=True) #grab manuals
+            except ExportError as e:
+                failures.append("site " + this_site_id + ": " + str(e))
+                continue
 
             # loop through manuals
             for manual in manuals['site']['manuals']:
@@ -554,160 +782,84 @@ def main(argv):
                     else:
                         this_manual_identifier = this_manual_id
 
-                    chapters = screensteps('sites/' + this_site_id + '/manuals/' + this_manual_id) # grab chapters
+                    try:
+                        chapters = screensteps('sites/' + this_site_id + '/manuals/' + this_manual_id, cached=True) # grab chapters
+                    except ExportError as e:
+                        failures.append("manual " + this_manual_id + ": " + str(e))
+                        continue
 
                     # pre-chapter replaces on _decode(manual_files_ref[path][0])
                     if is_manual_files: # are there templates?
                         manual_files_temp = {}
                         for path, details in manual_files.items():
                             manual_files_temp[path] = []
-                            manual_files_temp[path].append(_decode(manual_files_ref[path][0]).replace('{{title}}', chapters['manual']['title']))
-
-                    # loop through chapters
-                    for chapter in chapters['manual']['chapters']:
-                        this_chapter_id = _decode(chapter['id'])
-                        print(">>>> Processing chapter: " + _print(chapter['title']))
-                        # print(">>>> " + _print(chapter))
-
-                        chapter['articles'] = []
-
-                        # pre-article replaces on _decode(manual_files_ref[path][1])
-                        if is_manual_files: # are there templates?
-                            for path, details in manual_files.items():
-                                manual_files_temp[path].append(_decode(manual_files_ref[path][1]).replace('{{title}}', chapter['title']))
-
-                        articles = screensteps('sites/' + this_site_id + '/chapters/' + this_chapter_id) # grab articles
-
-                        # loop through articles
-                        for article in articles['chapter']['articles']:
-                            this_article_id = _decode(article['id'])
-                            if (article_id == this_article_id) or (article_id == ''): # only action an article if article_id isn't set, or is a match
-                                print(">>>>> Processing article: " + _print(article['title']))
-                                # print(">>>>> " + _print(article))
-
-                                this_article = screensteps('sites/' + this_site_id + '/articles/' + this_article_id) # grab ind article
-
-                                this_article_title = this_article['article']['title']
-
-                                if object_identifier == "title_id":
-                                    this_article_identifier = prepare_for_filename(this_article_title) + " [" + this_article_id + "]"
-                                elif object_identifier == "title":
-                                    this_article_identifier = prepare_for_filename(this_article_title)
-                                else:
-                                    this_article_identifier = this_article_id
-
-                                if is_article_folder:
-                                    article_folder = os.path.join(site_folder, find_relative_path(at_article_folder,template_folder), this_article_identifier)
-                                    copy_and_overwrite(at_article_folder, article_folder)
-                                else:
-                                    # write html to a file if no templates
-                                    article_folder = site_folder
+                            manual_files_temp[path].append(manual_files_ref[path][0].render({'title': chapters['manual']['title']}))
+
+                    with ThreadPoolExecutor(max_workers=jobs) as executor:
+                        # grab the articles of every chapter in parallel
+                        chapter_futures = [executor.submit(screensteps, 'sites/' + this_site_id + '/chapters/' + _decode(chapter['id']), True)
+                                           for chapter in chapters['manual']['chapters']]
+
+                        # then queue every article; each one is written out as soon as it's fetched
+                        article_futures = []
+                        for chapter, chapter_future in zip(chapters['manual']['chapters'], chapter_futures):
+                            try:
+                                articles = chapter_future.result()
+                            except ExportError as e:
+                                failures.append("chapter " + _decode(chapter['id']) + ": " + str(e))
+                                article_futures.append(None)
+                                continue
+                            article_futures.append([(article, executor.submit(export_article, this_site_id, site_folder, article))
+                                                    for article in articles['chapter']['articles']
+                                                    if (article_id == _decode(article['id'])) or (article_id == '')]) # only action an article if article_id isn't set, or is a match
+
+                        # loop through chapters, assembling the toc in manual order
+                        for chapter, chapter_article_futures in zip(chapters['manual']['chapters'], article_futures):
+                            chapter['articles'] = []
+                            if chapter_article_futures is None:
+                                continue
+                            print(">>>> Processing chapter: " + _print(chapter['title']))
+                            # print(">>>> " + _print(chapter))
+
+                            # pre-article replaces on _decode(manual_files_ref[path][1])
+                            if is_manual_files: # are there templates?
+                                for path, details in manual_files.items():
+                                    manual_files_temp[path].append(manual_files_ref[path][1].render({'title': chapter['title']}))
+
+                            for article, article_future in chapter_article_futures:
+                                try:
+                                    this_article, this_article_identifier, article_files_paths, article_values = article_future.result()
+                                except Exception as e:
+                                    failures.append("article " + _decode(article['id']) + ": " + str(e))
+                                    continue
 
                                 # Add to list of article ids and titles
                                 chapter["articles"].append( {'id': this_article['article']['id'], 'title': this_article_identifier} )
 
-                                article_html = this_article['article']['html_body']
-
-                                # loop through attached files
-                                this_articles_files = []
-                                for content_block in this_article['article']['content_blocks']:
-                                    if 'url' in content_block:
-
-                                        # what type of file is it?
-                                        download_ext = os.path.splitext(urlparse(content_block['url']).path)[1]
-                                        if content_block['type'] == 'AttachmentContent': # attachment
-                                            if is_attach_folder:
-                                                files_folder = os.path.join(site_folder,at_attach_folder)
-                                                short_files_folder = at_attach_folder
-                                                if '@article' in files_folder:
-                                                    files_folder = files_folder.replace("@article", this_article_identifier)
-                                                    short_files_folder = short_files_folder.replace("@article", this_article_identifier)
-                                            else:
-                                                files_folder = os.path.join(article_folder, 'attachments')
-                                                short_files_folder = 'attachments'
-                                                make_dir(files_folder)
-                                        else: # image
-                                            if is_image_folder:
-                                                files_folder = os.path.join(site_folder,at_images_folder)
-                                                short_files_folder = at_images_folder
-                                                if '@article' in files_folder:
-                                                    files_folder = files_folder.replace("@article", this_article_identifier)
-                                                    short_files_folder = short_files_folder.replace("@article", this_article_identifier)
-                                            else:
-                                                files_folder = os.path.join(article_folder, 'images')
-                                                short_files_folder = 'images'
-                                                make_dir(files_folder)
-
-                                        print(">>>>>> Processing " + _print(content_block['type']) + ": " + _print(content_block['url']))
-                                        new_file_path = download_file(files_folder,content_block['url'])
-                                        this_articles_files.append([ _decode(content_block['url']), os.path.join(short_files_folder,new_file_path)])
-
-                                article_files_paths = []
-                                if template_specified:
-                                    # step through each file that starts with "@article"
-                                    for path, temp_html in article_files.items():
-
-                                        back_dir = ''
-                                        article_relative_path = find_relative_path(path,template_folder)
-                                        temp_filename = this_article_identifier + os.path.splitext(path)[1]
-                                        if article_relative_path != '':
-                                            article_relative_path = article_relative_path.replace("@article", this_article_identifier)
-                                            temp_filename = os.path.join(article_relative_path,temp_filename)
-                                            back_dir = '../' * len(split_path(article_relative_path))
-
-                                        # find and replace {{html}}
-                                        temp_towrite = temp_html.replace("""{{html}}""",article_html)
-                                        temp_towrite = temp_towrite.replace("""{{json}}""",json.dumps(this_article, sort_keys=True, indent=2, separators=(',', ': ')))
-
-                                        # find and replace all the other handlebars specified
-                                        for article_handlebar in article_handlebars:
-                                            if article_handlebar != "link":
-                                                temp_towrite = temp_towrite.replace(("{{" + _decode(article_handlebar) + "}}"), _decode(this_article['article'][article_handlebar]) )
-
-                                        for this_articles_file in this_articles_files:
-                                            # take off any query params
-                                            image_url = this_articles_file[0].split("?", 1)[0]
-                                            temp_towrite = temp_towrite.replace(image_url,(back_dir + this_articles_file[1].replace("\\", "/"))) # Fix windows paths
-                                            # workaround: perform replace on thumbnail images
-                                            thumbnail_url = image_url.replace("/original/", "/medium/")
-                                            temp_towrite = temp_towrite.replace(thumbnail_url,(back_dir + this_articles_file[1].replace("\\", "/"))) # Fix windows paths
-
-                                        # write file
-                                        write_file(site_folder, temp_filename, temp_towrite)
-                                        article_files_paths.append(temp_filename)
-                                else:
-                                    for this_articles_file in this_articles_files:
-                                        article_html = article_html.replace(this_articles_file[0],this_articles_file[1].replace("\\", "/")) # Fix windows paths
-                                    write_file(article_folder, (this_article_identifier + '.html'), article_html)
-                                    article_files_paths.append((this_article_identifier + '.html'))
-
                                 # article replaces on _decode(manual_files_ref[path][2])
                                 if is_manual_files: # are there templates?
-                                    article_handlebars.append("link")
-
                                     for path, details in manual_files.items():
-                                        article_string = _decode(manual_files_ref[path][2])
-                                        for article_handlebar in article_handlebars:
-                                            if article_handlebar == "link":
-                                                try:
-                                                    same_ext_link = next(i for i in article_files_paths if os.path.splitext(i)[1] ==  os.path.splitext(path)[1])
-                                                except:
-                                                    print("Error: We didn't find a file extension match for the article from the TOC with: " + os.path.splitext(path)[1])
-                                                    sys.exit()
-                                                article_string = article_string.replace(("{{" + _decode(article_handlebar) + "}}"), same_ext_link)
-                                            else:
-                                                article_string = article_string.replace(("{{" + _decode(article_handlebar) + "}}"),_decode(this_article['article'][article_handlebar]))
-                                        manual_files_temp[path].append(article_string)
-
-                        # post-article replaces on _decode(manual_files_ref[path][3])
-                        if is_manual_files: # are there templates?
-                            for path, details in manual_files.items():
-                                manual_files_temp[path].append(_decode(manual_files_ref[path][3]).replace('{{title}}',_decode(chapter['title'])))
+                                        def same_ext_link(path=path, article_files_paths=article_files_paths):
+                                            try:
+                                                return next(i for i in article_files_paths if os.path.splitext(i)[1] ==  os.path.splitext(path)[1])
+                                            except:
+                                                print("Error: We didn't find a file extension match for the article from the TOC with: " + os.path.splitext(path)[1])
+                                                sys.exit()
+                                        toc_values = dict(article_values)
+                                        toc_values['link'] = same_ext_link
+                                        # {{html}} and {{json}} are only filled in article files
+                                        del toc_values['html'], toc_values['json']
+                                        manual_files_temp[path].append(manual_files_ref[path][2].render(toc_values))
+
+                            # post-article replaces on _decode(manual_files_ref[path][3])
+                            if is_manual_files: # are there templates?
+                                for path, details in manual_files.items():
+                                    manual_files_temp[path].append(manual_files_ref[path][3].render({'title': _decode(chapter['title'])}))
 
                     # post-chapter replaces on _decode(manual_files_ref[path][4])
                     if is_manual_files: # are there templates?
                         for path, details in manual_files.items():
-                            manual_files_temp[path].append(_decode(manual_files_ref[path][4]).replace('{{title}}',chapters['manual']['title']))
+                            manual_files_temp[path].append(manual_files_ref[path][4].render({'title': chapters['manual']['title']}))
 
                             manual_relative_path = find_relative_path(path,template_folder)
                             if manual_relative_path == '':
@@ -721,21 +873,22 @@ def main(argv):
                             else:
                                 temp_filename = this_manual_identifier + os.path.splitext(path)[1]
                             temp_file_contents = (''.join(manual_files_temp[path]) + add_end_manual_file)
-                            temp_file_contents = temp_file_contents.replace("""{{json}}""", json.dumps(chapters, sort_keys=True, indent=2, separators=(',', ': ')))
+                            # only serialize the manual when the @toc file asks for it
+                            if "{{json}}" in temp_file_contents:
+                                temp_file_contents = temp_file_contents.replace("""{{json}}""", json.dumps(chapters, sort_keys=True, indent=2, separators=(',', ': ')))
                             write_file(manual_relative_path, temp_filename, temp_file_contents)
 
-            # clean up the "@" files that we copied over for each site
-            if template_specified:
-                try:
-                    remove_found_files(find_file(article_file_indicator,site_folder))
-                    remove_found_files(find_file(manual_file_indicator,site_folder))
-                    remove_found_files(find_file(image_folder_indicator,site_folder))
-                    remove_found_files(find_file(attach_folder_indicator,site_folder))
-                    remove_directories(find_dirs("@article", site_folder))
-                except:
-                    print("We had trouble deleting the copied template files.  You can ignore any extra files.")
-
-def get_manual(site_name, user_id, api_token, site_id, manual_id, output_folder="temp"):
+            # the "@" files are never copied into the site folder (see copy_and_overwrite),
+            # so there is nothing to clean up here
+
+    if failures:
+        print("Finished with " + str(len(failures)) + " failure(s):")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+
+def get_manual(site_name, user_id, api_token, site_id, manual_id, output_folder="temp", workers=1, sync_state=None,
+               profile="mirror"):
     """
     Pull all articles from a specified manual and save them to the output folder.
     
@@ -746,37 +899,18 @@ def get_manual(site_name, user_id, api_token, site_id, manual_id, output_folder=
     site_id (str): The ID of the site containing the manual
     manual_id (str): The ID of the manual to retrieve
     output_folder (str): Folder to save the manual data (default: "temp")
+    workers (int): Number of chapters/articles fetched in parallel (default: 1)
+    sync_state (SyncState): If given, articles already synced at this version get no folder (default: None)
+    profile (str): Fetch profile, "rag" downloads images only, "mirror" attachments too (default: "mirror")
     
     Returns:
     dict: The manual data with TOC information
     """
-    def screensteps_json(endpoint):
-        base_url = 'https://' + site_name + '.screenstepslive.com/api/v2/'
-        site_endpoint = base_url + endpoint
-        try:
-            while True:
-                r = requests.get(site_endpoint, auth=(user_id, api_token))
-
-                if r.status_code == 200:
-                    return r.text
-                elif r.status_code == 429:
-                    # Rate limit exceeded
-                    try:
-                        retry_info = r.json()
-                        retry_in = retry_info.get('retry_in', 60)  # Default to 60 seconds if not provided
-                        print(f"Rate limit exceeded. Retrying in {retry_in} seconds...")
-                        time.sleep(retry_in)
-                    except ValueError:
-                        # Failed to parse JSON, fall back to a default wait time
-                        print("Rate limit exceeded. Retrying in 60 seconds (default)...")
-                        time.sleep(60)
-                else:
-                    print(f'Error connecting to server ({r.status_code})')
-                    return None
-        except requests.exceptions.RequestException as e:
-            print("Error connecting to server:", e)
-            return None
-            
+    client = ScreenStepsClient(site_name, user_id, api_token)
+    screensteps_json = client.get_text
+    # site/manual/chapter hierarchy rarely changes, serve it from the response cache
+    screensteps_hierarchy_json = client.get_cached_text
+
     # Create output folder structure for the manual
     output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), output_folder)
     manual_folder = os.path.join(output_path, manual_id)
@@ -784,7 +918,7 @@ def get_manual(site_name, user_id, api_token, site_id, manual_id, output_folder=
     
     # Get site information
     site_endpoint = 'sites/' + site_id
-    site_raw_text = screensteps_json(site_endpoint)
+    site_raw_text = screensteps_hierarchy_json(site_endpoint)
     if not site_raw_text:
         return None
     
@@ -792,7 +926,7 @@ def get_manual(site_name, user_id, api_token, site_id, manual_id, output_folder=
     
     # Get manual details
     manual_endpoint = 'sites/' + site_id + '/manuals/' + str(manual_id)
-    manual_raw_text = screensteps_json(manual_endpoint)
+    manual_raw_text = screensteps_hierarchy_json(manual_endpoint)
     if not manual_raw_text:
         return None
     
@@ -810,106 +944,114 @@ def get_manual(site_name, user_id, api_token, site_id, manual_id, output_folder=
         },
         "chapters": []
     }
-    
-    # Process each chapter
-    for chapter in manual_info['manual']['chapters']:
-        chapter_id = str(chapter['id'])
-        
+
+    def fetch_chapter(chapter):
         # Get chapter details
-        chapter_endpoint = 'sites/' + site_id + '/chapters/' + chapter_id
-        chapter_raw_text = screensteps_json(chapter_endpoint)
-        if not chapter_raw_text:
-            continue
-        
-        chapter_info = json.loads(chapter_raw_text)
-        
-        # Add chapter to TOC
-        chapter_toc = {
-            "id": chapter_id,
-            "title": chapter['title'],
-            "articles": []
-        }
-        
-        # Process each article in the chapter
-        for article in chapter_info['chapter']['articles']:
-            article_id = str(article['id'])
-            
-            # Get article details
-            article_endpoint = 'sites/' + site_id + '/articles/' + article_id
-            article_raw_text = screensteps_json(article_endpoint)
-            if not article_raw_text:
+        chapter_endpoint = 'sites/' + site_id + '/chapters/' + str(chapter['id'])
+        return screensteps_hierarchy_json(chapter_endpoint)
+
+    def fetch_article(article):
+        # Get article details
+        article_endpoint = 'sites/' + site_id + '/articles/' + str(article['id'])
+        article_raw_text = screensteps_json(article_endpoint)
+        if not article_raw_text:
+            return None
+        return json.loads(article_raw_text)
+
+    # executor.map keeps results in submission order, so the TOC is assembled
+    # exactly as the serial loop would have built it
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        chapters = manual_info['manual']['chapters']
+        article_jobs = []
+        for chapter, chapter_raw_text in zip(chapters, executor.map(fetch_chapter, chapters)):
+            if not chapter_raw_text:
                 continue
             
-            article_data = json.loads(article_raw_text)
-            
-            # Create article folder structure
-            article_folder = os.path.join(manual_folder, article_id)
-            images_folder = os.path.join(article_folder, 'images')
-            attachments_folder = os.path.join(article_folder, 'attachments')
-            
-            # Create necessary directories
-            for directory in [article_folder, images_folder, attachments_folder]:
-                make_dir(directory)
+            chapter_info = json.loads(chapter_raw_text)
             
-            # Build article TOC
-            article_toc = {
-                "site": {
-                    "id": site_id,
-                    "title": site_info['site']['title']
-                },
-                "manual": {
-                    "id": manual_id,
-                    "title": manual_info['manual']['title']
-                },
-                "chapter": {
-                    "id": chapter_id,
-                    "title": chapter['title']
-                },
-                "article": {
-                    "id": article_id,
-                    "title": article['title']
-                }
+            # Add chapter to TOC
+            chapter_toc = {
+                "id": str(chapter['id']),
+                "title": chapter['title'],
+                "articles": []
             }
+            manual_toc['chapters'].append(chapter_toc)
             
-            # Save the article JSON data
-            with open(os.path.join(article_folder, f"{article_id}.json"), 'w', encoding='utf-8') as f:
-                json.dump(article_toc, f, indent=2)
-            
-            # Add article to chapter TOC
-            chapter_toc['articles'].append({
+            for article in chapter_info['chapter']['articles']:
+                article_jobs.append((chapter, chapter_toc, article))
+
+        # Process each article in every chapter
+        fetched = list(executor.map(lambda job: fetch_article(job[2]), article_jobs))
+
+    # Collect the assets of the whole manual so they are downloaded in one batch
+    saved_articles = []
+    manual_assets = []
+    for (chapter, chapter_toc, article), article_data in zip(article_jobs, fetched):
+        if article_data is None:
+            continue
+        chapter_id = str(chapter['id'])
+        article_id = str(article['id'])
+        last_edited_at = article_data['article'].get('last_edited_at')
+        content_hash = article_content_hash(article_data)
+        
+        # Add article to chapter TOC
+        chapter_toc['articles'].append({
+            "id": article_id,
+            "title": article['title']
+        })
+
+        if sync_state and sync_state.is_unchanged(article_id, last_edited_at, content_hash):
+            print(f"Article {article_id} is unchanged since the last sync, skipping.")
+            continue
+        
+        # Create article folder structure
+        article_folder = os.path.join(manual_folder, article_id)
+        images_folder = os.path.join(article_folder, 'images')
+        attachments_folder = os.path.join(article_folder, 'attachments')
+        
+        # Create necessary directories
+        for directory in [article_folder, images_folder, attachments_folder]:
+            make_dir(directory)
+        
+        # Build article TOC
+        article_toc = {
+            "site": {
+                "id": site_id,
+                "title": site_info['site']['title']
+            },
+            "manual": {
+                "id": manual_id,
+                "title": manual_info['manual']['title']
+            },
+            "chapter": {
+                "id": chapter_id,
+                "title": chapter['title']
+            },
+            "article": {
                 "id": article_id,
-                "title": article['title']
-            })
-            
-            # Extract and save HTML content
-            article_html = article_data['article']['html_body']
-            
-            # Process attachments and images
-            for content_block in article_data['article']['content_blocks']:
-                if 'url' in content_block:
-                    if content_block['type'] == 'AttachmentContent':
-                        # Download attachment
-                        download_file(attachments_folder, content_block['url'])
-                        # Update HTML to point to local file
-                        file_name = content_block['url'].split('/')[-1].split('?')[0]
-                        article_html = article_html.replace(content_block['url'], f"attachments/{file_name}")
-                    else:
-                        # Download image
-                        file_name = download_file(images_folder, content_block['url'])
-                        # Update HTML to point to local file
-                        article_html = article_html.replace(content_block['url'], f"images/{file_name}")
-                        # Handle thumbnails too
-                        thumbnail_url = content_block['url'].replace("/original/", "/medium/")
-                        article_html = article_html.replace(thumbnail_url, f"images/{file_name}")
-            
-            # Save the HTML
-            with open(os.path.join(article_folder, f"{article_id}.html"), 'w', encoding='utf-8') as f:
-                f.write(article_html)
-            
-            print(f"Article {article_id} saved to {article_folder}")
+                "title": article['title'],
+                "last_edited_at": last_edited_at,
+                "content_hash": content_hash
+            }
+        }
+        
+        # Save the article JSON data
+        with open(os.path.join(article_folder, f"{article_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump(article_toc, f, indent=2)
+
+        assets = collect_article_assets(article_data, images_folder, attachments_folder, profile)
+        manual_assets.extend(assets)
+        saved_articles.append((article_id, article_folder, article_data, assets))
+
+    downloaded = download_files((directory, content_block['url']) for content_block, directory, _ in manual_assets)
+
+    for article_id, article_folder, article_data, assets in saved_articles:
+        # Extract and save HTML content
+        article_html = localize_article_html(article_data['article']['html_body'], assets, downloaded)
+        with open(os.path.join(article_folder, f"{article_id}.html"), 'w', encoding='utf-8') as f:
+            f.write(article_html)
         
-        # Add chapter to manual TOC
-        manual_toc['chapters'].append(chapter_toc)
+        print(f"Article {article_id} saved to {article_folder}")
     
     # Save the manual TOC
     with open(os.path.join(manual_folder, f"{manual_id}.json"), 'w', encoding='utf-8') as f:
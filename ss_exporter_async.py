@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+asyncio/aiohttp engine for the ScreenSteps exporter.
+Produces the same folders and TOC data as ss_exporter.get_article and
+ss_exporter.get_manual, but runs the hierarchy crawl, article fetches and asset
+downloads as coroutines with semaphore-bounded concurrency. get_article_bundle,
+get_article and get_manual below are synchronous wrappers with the same
+signatures, so callers can switch engines without other changes.
+"""
+import asyncio
+import json
+import os
+
+import aiohttp
+
+from ss_exporter import collect_article_assets, localize_article_html, make_article_bundle, make_dir
+from src.config import (
+    SCREENSTEPS_TIMEOUT,
+    SCREENSTEPS_API_POOL_SIZE,
+    SCREENSTEPS_ASSET_POOL_SIZE,
+    ASSET_DOWNLOAD_WORKERS,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_RETRY_BACKOFF,
+    ASSET_MAX_BYTES,
+    FETCH_WORKERS,
+    RESPONSE_CACHE_TTL,
+)
+from src.article_bundle import ArticleBundle
+from src.asset_store import get_asset_store
+from src.rate_limiter import get_rate_limiter
+from src.screensteps_client import (
+    DownloadError,
+    check_limit,
+    check_size,
+    discard_partial,
+    expected_size,
+    get_response_cache,
+    is_fresh,
+    link_assets,
+    parse_retry_in,
+    partial_path,
+    response_cache_key,
+    resume_headers,
+    revalidation_headers,
+    save_validator,
+    store_staged_file,
+    update_cached_response,
+    url_file_name,
+)
+from src.sync_state import article_content_hash
+
+# URLs being fetched into the asset store, so concurrent coroutines share one download
+_pending_assets = {}
+
+
+class AsyncScreenStepsClient:
+    """
+    Coroutine counterpart of ScreenStepsClient.
+
+    Args:
+        session (aiohttp.ClientSession): Session shared by every request of the export.
+        site_name (str): The name of the site (account name)
+        user_id (str): User ID for authentication
+        api_token (str): API token or password for authentication
+        workers (int, optional): Maximum number of API requests in flight.
+        asset_workers (int, optional): Maximum number of downloads in flight.
+    """
+
+    def __init__(self, session, site_name, user_id, api_token, workers=FETCH_WORKERS,
+                 asset_workers=ASSET_DOWNLOAD_WORKERS):
+        self.session = session
+        self.base_url = 'https://' + site_name + '.screenstepslive.com/api/v2/'
+        self.user_id = user_id
+        self.auth = aiohttp.BasicAuth(user_id, api_token)
+        self.limiter = get_rate_limiter()
+        self.cache = get_response_cache()
+        self.store = get_asset_store()
+        self.api_semaphore = asyncio.Semaphore(max(1, workers))
+        self.asset_semaphore = asyncio.Semaphore(max(1, asset_workers))
+        self.partial_locks = {}
+
+    async def get_text(self, endpoint):
+        """Fetch an API endpoint and return the raw response body, or None on failure."""
+        response = await self._get(endpoint)
+        return response[1] if response is not None else None
+
+    async def get_cached_text(self, endpoint, ttl=RESPONSE_CACHE_TTL):
+        """Fetch an API endpoint through the on-disk response cache (see ScreenStepsClient)."""
+        key = response_cache_key(self.user_id, self.base_url + endpoint)
+        entry = self.cache.get_json(key)
+        if is_fresh(entry, ttl):
+            return entry['body']
+
+        response = await self._get(endpoint, headers=revalidation_headers(entry))
+        if response is None:
+            return None
+        status, body, response_headers = response
+        return update_cached_response(self.cache, key, entry, status, body, response_headers)
+
+    async def _get(self, endpoint, headers=None):
+        """Send a rate-limited GET, returning (status, body, headers) for 200/304 or None."""
+        site_endpoint = self.base_url + endpoint
+        try:
+            while True:
+                await self.limiter.acquire_async()
+
+                async with self.api_semaphore:
+                    async with self.session.get(site_endpoint, auth=self.auth, headers=headers) as r:
+                        status = r.status
+                        body = await r.text()
+                        response_headers = r.headers
+
+                if status in (200, 304):
+                    self.limiter.on_success()
+                    return status, body, response_headers
+                elif status == 429:
+                    # Rate limit exceeded, pause every worker sharing the limiter
+                    retry_in = parse_retry_in(body)
+                    print(f"Rate limit exceeded. Pausing requests for {retry_in} seconds...")
+                    self.limiter.on_rate_limited(retry_in)
+                else:
+                    print(f'Error connecting to server ({status})')
+                    return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print("Error connecting to server:", e)
+            return None
+
+    async def download_file(self, directory, url):
+        """
+        Stream a file into directory via a ".part" file that is renamed into place.
+        Like screensteps_client.download_file, interrupted downloads are resumed
+        with a conditional (If-Range) Range request, the result is checked against Content-Length
+        and files over ASSET_MAX_BYTES are refused.
+        """
+        short_path = url_file_name(url)
+        local_filename = os.path.join(directory, short_path)
+        partial_filename = partial_path(directory, short_path)
+        async with self._partial_lock(partial_filename):
+            for attempt in range(DOWNLOAD_RETRIES + 1):
+                try:
+                    await self._download_range(url, partial_filename)
+                    os.replace(partial_filename, local_filename)
+                    discard_partial(partial_filename, keep_body=True)
+                    return short_path
+                except (aiohttp.ClientError, asyncio.TimeoutError, DownloadError) as e:
+                    if isinstance(e, DownloadError) and (e.restart or not e.retryable):
+                        discard_partial(partial_filename)
+                    if (isinstance(e, DownloadError) and not e.retryable) or attempt == DOWNLOAD_RETRIES:
+                        raise
+                    wait = DOWNLOAD_RETRY_BACKOFF * 2 ** attempt
+                    print(f"Download of {url} interrupted ({e}), resuming in {wait} seconds...")
+                    await asyncio.sleep(wait)
+
+    async def _download_range(self, url, partial_filename):
+        """Fetch whatever is missing from partial_filename, raising DownloadError if it's still incomplete."""
+        offset, headers = resume_headers(partial_filename)
+        async with self.asset_semaphore:
+            async with self.session.get(url, headers=headers) as r:
+                expected = expected_size(r.status, r.headers, offset)
+                check_limit(expected, ASSET_MAX_BYTES)
+                if expected == offset and r.status == 416:
+                    # The partial file already holds the whole body
+                    return
+                if r.status != 206:
+                    save_validator(partial_filename, r.headers)
+                with open(partial_filename, 'ab' if r.status == 206 else 'wb') as f:
+                    async for chunk in r.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        check_limit(f.tell(), ASSET_MAX_BYTES)
+        check_size(partial_filename, expected)
+
+    def _partial_lock(self, path):
+        """Return the lock serialising downloads into the same partial file."""
+        return self.partial_locks.setdefault(path, asyncio.Lock())
+
+    async def fetch_assets(self, urls):
+        """
+        Coroutine counterpart of screensteps_client.fetch_assets: make sure every
+        URL is in the asset store, downloading the missing ones concurrently.
+
+        Returns:
+            dict: Maps each successful URL to the path of its blob in the store.
+        """
+        async def fetch(url):
+            source = self.store.lookup(url)
+            if source is not None:
+                return source
+            # Another article may be fetching the same URL right now, wait for it instead
+            pending = _pending_assets.get(url)
+            if pending is not None:
+                return await asyncio.shield(pending)
+            future = _pending_assets[url] = asyncio.get_running_loop().create_future()
+            try:
+                source = self.store.lookup(url)
+                if source is None:
+                    staging = self.store.staging_dir(url)
+                    staged = os.path.join(staging, await self.download_file(staging, url))
+                    source = store_staged_file(self.store, url, staged)
+                future.set_result(source)
+                return source
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                # Mark it retrieved, the error is reported by every caller that awaited it
+                future.exception()
+                raise
+            finally:
+                del _pending_assets[url]
+
+        urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*(fetch(url) for url in urls), return_exceptions=True)
+        blobs = {}
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                print(f"Error downloading {url}: {result}")
+                continue
+            blobs[url] = result
+        return blobs
+
+    async def download_files(self, jobs):
+        """
+        Download a batch of files concurrently, one request per URL.
+        Like screensteps_client.download_files, URLs already in the asset store
+        are linked from it instead of being downloaded.
+
+        Args:
+            jobs (iterable): (directory, url) pairs.
+
+        Returns:
+            dict: Maps each successful (directory, url) pair to the saved file name.
+        """
+        targets = {}
+        for directory, url in jobs:
+            directories = targets.setdefault(url, [])
+            if directory not in directories:
+                directories.append(directory)
+
+        return link_assets(targets, await self.fetch_assets(targets))
+
+
+def create_session():
+    """Create the aiohttp session used for one export, with keep-alive pooling and timeouts."""
+    connect_timeout, read_timeout = SCREENSTEPS_TIMEOUT
+    connector = aiohttp.TCPConnector(limit=SCREENSTEPS_API_POOL_SIZE + SCREENSTEPS_ASSET_POOL_SIZE,
+                                     limit_per_host=SCREENSTEPS_ASSET_POOL_SIZE)
+    timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def async_get_article_bundle(site_name, user_id, api_token, site_id, article_id, sync_state=None, profile="mirror"):
+    """
+    Coroutine version of ss_exporter.get_article_bundle.
+
+    Returns:
+    ArticleBundle: The article, or None if a request failed.
+    """
+    async with create_session() as session:
+        client = AsyncScreenStepsClient(session, site_name, user_id, api_token)
+
+        # The article and the site can be fetched together
+        raw_text, site_raw_text = await asyncio.gather(
+            client.get_text('sites/' + site_id + '/articles/' + article_id),
+            client.get_cached_text('sites/' + site_id))
+        if not raw_text or not site_raw_text:
+            return None
+
+        article_data = json.loads(raw_text)
+        article_version = {
+            "id": article_data['article']['id'],
+            "title": article_data['article']['title'],
+            "last_edited_at": article_data['article'].get('last_edited_at'),
+            "content_hash": article_content_hash(article_data)
+        }
+        if sync_state and sync_state.is_unchanged(article_id, article_version['last_edited_at'], article_version['content_hash']):
+            print(f"Article {article_id} is unchanged since the last sync, skipping.")
+            return ArticleBundle(article_id, {"article": article_version}, unchanged=True)
+
+        site_info = json.loads(site_raw_text)
+        manual_id = article_data['article']['manual_id']
+        chapter_id = article_data['article']['chapter_id']
+
+        # Start the asset downloads while the manual is looked up
+        assets = collect_article_assets(article_data, 'images', 'attachments', profile)
+        downloads = asyncio.ensure_future(client.fetch_assets(content_block['url'] for content_block, _, _ in assets))
+
+        manual_raw_text = await client.get_cached_text('sites/' + site_id + '/manuals/' + str(manual_id))
+        if not manual_raw_text:
+            downloads.cancel()
+            return None
+        manual_info = json.loads(manual_raw_text)
+
+        chapter_info = None
+        for chapter in manual_info['manual']['chapters']:
+            if str(chapter['id']) == str(chapter_id):
+                chapter_info = chapter
+                break
+
+        if not chapter_info:
+            # If we didn't find the chapter in the manual, try getting it directly
+            chapter_raw_text = await client.get_cached_text('sites/' + site_id + '/chapters/' + str(chapter_id))
+            if chapter_raw_text:
+                chapter_info = json.loads(chapter_raw_text)['chapter']
+
+        toc_data = {
+            "site": {
+                "id": site_id,
+                "title": site_info['site']['title']
+            },
+            "manual": {
+                "id": manual_id,
+                "title": manual_info['manual']['title']
+            },
+            "chapter": {
+                "id": chapter_id,
+                "title": chapter_info['title'] if chapter_info else "Unknown Chapter"
+            },
+            "article": article_version
+        }
+
+        blobs = await downloads
+    return make_article_bundle(article_id, article_data, toc_data, assets, blobs)
+
+
+async def async_get_article(site_name, user_id, api_token, site_id, article_id, output_folder="temp", sync_state=None,
+                            profile="mirror"):
+    """
+    Coroutine version of ss_exporter.get_article.
+
+    Returns:
+    dict: The article data with TOC information, or None if a request failed.
+    """
+    bundle = await async_get_article_bundle(site_name, user_id, api_token, site_id, article_id,
+                                            sync_state=sync_state, profile=profile)
+    if bundle is None:
+        return None
+    if bundle.unchanged:
+        return {"article": bundle.toc['article'], "unchanged": True}
+
+    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), output_folder)
+    article_folder = bundle.save(os.path.join(output_path, article_id))
+    bundle.release()
+
+    print(f"Article saved to {article_folder} with the requested structure")
+    return bundle.toc
+
+
+async def async_get_manual(site_name, user_id, api_token, site_id, manual_id, output_folder="temp", workers=FETCH_WORKERS,
+                           sync_state=None, profile="mirror"):
+    """
+    Coroutine version of ss_exporter.get_manual.
+    Each article's assets are downloaded as soon as the article arrives, while
+    the rest of the manual is still being crawled.
+
+    Returns:
+    dict: The manual data with TOC information, or None if a request failed.
+    """
+    async with create_session() as session:
+        client = AsyncScreenStepsClient(session, site_name, user_id, api_token, workers=workers)
+
+        output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), output_folder)
+        manual_folder = os.path.join(output_path, manual_id)
+        make_dir(manual_folder)
+
+        site_raw_text, manual_raw_text = await asyncio.gather(
+            client.get_cached_text('sites/' + site_id),
+            client.get_cached_text('sites/' + site_id + '/manuals/' + str(manual_id)))
+        if not site_raw_text or not manual_raw_text:
+            return None
+        site_info = json.loads(site_raw_text)
+        manual_info = json.loads(manual_raw_text)
+
+        manual_toc = {
+            "site": {
+                "id": site_id,
+                "title": site_info['site']['title']
+            },
+            "manual": {
+                "id": manual_id,
+                "title": manual_info['manual']['title']
+            },
+            "chapters": []
+        }
+
+        async def save_article(chapter, article):
+            """Fetch one article with its assets. Returns False if the fetch failed."""
+            chapter_id = str(chapter['id'])
+            article_id = str(article['id'])
+            article_raw_text = await client.get_text('sites/' + site_id + '/articles/' + article_id)
+            if not article_raw_text:
+                return False
+            article_data = json.loads(article_raw_text)
+            last_edited_at = article_data['article'].get('last_edited_at')
+            content_hash = article_content_hash(article_data)
+            if sync_state and sync_state.is_unchanged(article_id, last_edited_at, content_hash):
+                print(f"Article {article_id} is unchanged since the last sync, skipping.")
+                return True
+
+            article_folder = os.path.join(manual_folder, article_id)
+            images_folder = os.path.join(article_folder, 'images')
+            attachments_folder = os.path.join(article_folder, 'attachments')
+            for directory in [article_folder, images_folder, attachments_folder]:
+                make_dir(directory)
+
+            article_toc = {
+                "site": {
+                    "id": site_id,
+                    "title": site_info['site']['title']
+                },
+                "manual": {
+                    "id": manual_id,
+                    "title": manual_info['manual']['title']
+                },
+                "chapter": {
+                    "id": chapter_id,
+                    "title": chapter['title']
+                },
+                "article": {
+                    "id": article_id,
+                    "title": article['title'],
+                    "last_edited_at": last_edited_at,
+                    "content_hash": content_hash
+                }
+            }
+            with open(os.path.join(article_folder, f"{article_id}.json"), 'w', encoding='utf-8') as f:
+                json.dump(article_toc, f, indent=2)
+
+            assets = collect_article_assets(article_data, images_folder, attachments_folder, profile)
+            downloaded = await client.download_files(
+                (directory, content_block['url']) for content_block, directory, _ in assets)
+            article_html = localize_article_html(article_data['article']['html_body'], assets, downloaded)
+            with open(os.path.join(article_folder, f"{article_id}.html"), 'w', encoding='utf-8') as f:
+                f.write(article_html)
+
+            print(f"Article {article_id} saved to {article_folder}")
+            return True
+
+        async def crawl_chapter(chapter):
+            chapter_raw_text = await client.get_cached_text('sites/' + site_id + '/chapters/' + str(chapter['id']))
+            if not chapter_raw_text:
+                return None
+            articles = json.loads(chapter_raw_text)['chapter']['articles']
+            saved = await asyncio.gather(*(save_article(chapter, article) for article in articles))
+            return {
+                "id": str(chapter['id']),
+                "title": chapter['title'],
+                "articles": [{"id": str(article['id']), "title": article['title']}
+                             for article, article_saved in zip(articles, saved) if article_saved]
+            }
+
+        # gather keeps the chapter order of the manual
+        chapter_tocs = await asyncio.gather(*(crawl_chapter(chapter) for chapter in manual_info['manual']['chapters']))
+        manual_toc['chapters'] = [chapter_toc for chapter_toc in chapter_tocs if chapter_toc is not None]
+
+    with open(os.path.join(manual_folder, f"{manual_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump(manual_toc, f, indent=2)
+
+    print(f"Manual {manual_id} with {len(manual_toc['chapters'])} chapters saved to {manual_folder}")
+    return manual_toc
+
+
+def get_article_bundle(site_name, user_id, api_token, site_id, article_id, sync_state=None, profile="mirror"):
+    """Synchronous wrapper around async_get_article_bundle with the signature of ss_exporter.get_article_bundle."""
+    return asyncio.run(async_get_article_bundle(site_name, user_id, api_token, site_id, article_id,
+                                                sync_state=sync_state, profile=profile))
+
+
+def get_article(site_name, user_id, api_token, site_id, article_id, output_folder="temp", sync_state=None, profile="mirror"):
+    """Synchronous wrapper around async_get_article with the signature of ss_exporter.get_article."""
+    return asyncio.run(async_get_article(site_name, user_id, api_token, site_id, article_id,
+                                         output_folder=output_folder, sync_state=sync_state, profile=profile))
+
+
+def get_manual(site_name, user_id, api_token, site_id, manual_id, output_folder="temp", workers=FETCH_WORKERS, sync_state=None,
+               profile="mirror"):
+    """Synchronous wrapper around async_get_manual with the signature of ss_exporter.get_manual."""
+    return asyncio.run(async_get_manual(site_name, user_id, api_token, site_id, manual_id,
+                                        output_folder=output_folder, workers=workers, sync_state=sync_state,
+                                        profile=profile))
@@ -1,10 +1,15 @@
-from ss_exporter import get_article, get_manual
-from src.tag_and_markdown import tag_and_markdown 
+from src.tag_and_markdown import html_to_tagged_markdown
+from src.article_bundle import ArticleBundle
 from src.create_docs import load_documents
-from src.pinecone_ops import send_docs_to_pinecone, remove_article_pinecone
+from src.pinecone_ops import send_docs_to_pinecone, remove_article_pinecone, fetch_article_vectors, previous_summaries, sync_docs_to_pinecone
 from src.utils import is_software
-from src.config import TARGET_IMAGES_PATH
+from src.sync_state import SyncState
+from src.config import TARGET_IMAGES_PATH, FETCH_WORKERS, FETCH_PROFILE, EXPORTER_ENGINE, PERSIST_ARTICLE_FILES, VECTOR_SYNC_MODE, STREAM_DOCUMENTS
 from src.convert_images import convert_images_to_webp
+if EXPORTER_ENGINE == "asyncio":
+    from ss_exporter_async import get_article_bundle, get_manual
+else:
+    from ss_exporter import get_article_bundle, get_manual
 import os
 import shutil
 
@@ -13,32 +18,43 @@ import shutil
 current_article_id = None
 output_folder = "temp"
 
-def article_workflow(article_id, site_id):
+def article_workflow(article_id, site_id, incremental=False):
+    sync_state = SyncState() if incremental else None
     try:
         # Fetch the article
-        result = fetch_article(article_id, site_id, output_folder="temp")
+        result = fetch_article(article_id, site_id, output_folder="temp", sync_state=sync_state)
     except Exception as e:
         print(f"Error fetching article {article_id}: {str(e)}")
         remove_temp_folder(article_id)
         return False
+    if result is None:
+        # Unchanged since the last incremental sync
+        remove_temp_folder(article_id)
+        return True
     try:
-        process_article(article_id, site_id, result)
+        process_article(article_id, site_id, result, sync_state=sync_state)
     except Exception as e:
         print(f"Error processing article {article_id}: {str(e)}")
         return False
     finally:
         remove_temp_folder(article_id)
 
-def manual_workflow(manual_id, site_id):
+def manual_workflow(manual_id, site_id, incremental=False, index=False):
+    """
+    Fetch a manual and process its articles. Articles are only converted to markdown
+    unless index is True, in which case they're summarized and sent to the vectorstore
+    (and, with incremental, recorded as synced).
+    """
+    sync_state = SyncState() if incremental else None
     try:
         # Fetch the manual
-        result = fetch_manual(manual_id, site_id, output_folder="temp")
+        result = fetch_manual(manual_id, site_id, output_folder="temp", sync_state=sync_state)
     except Exception as e:
         print(f"Error fetching manual {manual_id}: {str(e)}")
         remove_temp_folder(manual_id)
         return False
     try:
-        process_manual(site_id, result)
+        process_manual(site_id, result, sync_state=sync_state, index=index)
     except Exception as e:
         print(f"Error processing manual {manual_id}: {str(e)}")
         return False
@@ -47,10 +63,11 @@ def manual_workflow(manual_id, site_id):
 
 
 
-def fetch_manual(manual_id, site_id, output_folder="temp"):
+def fetch_manual(manual_id, site_id, output_folder="temp", sync_state=None):
     print(f"Fetching manual {manual_id} from site {site_id}...")
     result = get_manual("orbitvu", "dev@orbitvu.com", os.environ.get("SCREENSTEPS_API_KEY"),
-                        str(site_id), str(manual_id), output_folder=output_folder)
+                        str(site_id), str(manual_id), output_folder=output_folder, workers=FETCH_WORKERS,
+                        sync_state=sync_state, profile=FETCH_PROFILE)
     if not result:
         print(f"Failed to fetch manual {manual_id}.")
         remove_temp_folder(manual_id)
@@ -60,21 +77,25 @@ def fetch_manual(manual_id, site_id, output_folder="temp"):
         man_dir_path = os.path.join(current_dir, f"{output_folder}/{manual_id}/")
         return man_dir_path
 
-def fetch_article(article_id, site_id, output_folder="temp"):
+def fetch_article(article_id, site_id, output_folder="temp", sync_state=None):
+    """Fetch an article into an ArticleBundle, saved under output_folder only if PERSIST_ARTICLE_FILES is set."""
 
     print(f"Fetching article {article_id} from site {site_id}...")
-    result = get_article("orbitvu", "dev@orbitvu.com", os.environ.get("SCREENSTEPS_API_KEY"), 
-                        str(site_id), str(article_id), output_folder=output_folder)
-    if not result:
+    bundle = get_article_bundle("orbitvu", "dev@orbitvu.com", os.environ.get("SCREENSTEPS_API_KEY"), 
+                                str(site_id), str(article_id), sync_state=sync_state, profile=FETCH_PROFILE)
+    if not bundle:
         print(f"Failed to fetch article {article_id}.")
         remove_temp_folder(article_id)
         return False
+    elif bundle.unchanged:
+        return None
     else:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        article_dir_path = os.path.join(current_dir, f"{output_folder}/{article_id}")
-        return article_dir_path
+        if PERSIST_ARTICLE_FILES:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            bundle.save(os.path.join(current_dir, f"{output_folder}/{article_id}"))
+        return bundle
 
-def process_manual(site_id, man_dir_path):
+def process_manual(site_id, man_dir_path, sync_state=None, index=False):
     """Process all articles in a manual folder."""
     # Get the manual_id from the path
     manual_id = os.path.basename(os.path.normpath(man_dir_path))
@@ -87,7 +108,8 @@ def process_manual(site_id, man_dir_path):
                 article_id = folder
                 print(f"Processing article path {folder_path}")
                 # Call the process_article function with the appropriate parameters
-                process_article(article_id, site_id, folder_path, debug=True)
+                # Without index only the markdown is created, and nothing is recorded as synced
+                process_article(article_id, site_id, folder_path, debug=not index, sync_state=sync_state)
         return True
     except Exception as e:
         print(f"Error processing manual: {str(e)}")
@@ -97,46 +119,85 @@ def process_manual(site_id, man_dir_path):
         if manual_id:
             remove_temp_folder(manual_id)
 
-def process_article(article_id, site_id, article_dir_path, debug=False):
-    """Process an article, creating vectorstore entries."""
+def process_article(article_id, site_id, article, debug=False, sync_state=None):
+    """Process an article, creating vectorstore entries.
+
+    article is the ArticleBundle returned by fetch_article, or the path of an
+    article folder (as written by get_manual) to load one from.
+    If sync_state is given, the article version is recorded once it has been
+    fully processed so the next incremental run can skip it.
+    """
     global current_article_id
     current_article_id = article_id
+    bundle = None
     
     try:
-        html_file_path = os.path.join(article_dir_path, f"{article_id}.html")
+        if isinstance(article, ArticleBundle):
+            bundle = article
+        else:
+            bundle = ArticleBundle.load(article, article_id) if article else None
         
-        if not os.path.exists(html_file_path):
-            print(f"HTML file not found at {html_file_path}")
+        if bundle is None or bundle.html is None:
+            print(f"HTML not found for article {article_id}")
             return False
 
         
         print(f"Converting HTML to markdown and tagging content...")
-        tag_and_markdown(html_file_path)
+        bundle.markdown = html_to_tagged_markdown(bundle.html, article_id)
+        bundle.save_markdown()
 
         if debug:
             print(f"Debug mode is ON. Skipping document loading and vectorstore operations for article {article_id}.")
             return True
 
-        isSoftware = is_software(article_id, article_dir_path)
-        print(f"Loading documents for article {article_id}...")
-        docs = load_documents(article_id, article_dir_path, software=isSoftware)
+        context = bundle.context
+        isSoftware = is_software(article_id, context=context)
+        stored_vectors = None
+        if VECTOR_SYNC_MODE == "diff":
+            print(f"Fetching existing records for article {article_id} from vectorstore...")
+            stored_vectors = fetch_article_vectors(article_id, software=isSoftware, context=context)
 
-        if not docs:
-            print("No documents were loaded. Processing failed.")
-            return False
-        
-        print(f"Removing existing records for article {article_id} from vectorstore...")
-        if not remove_article_pinecone(article_id, software=isSoftware, article_dir=article_dir_path):
-            print("Failed to remove existing records from vectorstore.")
+        print(f"Loading documents for article {article_id}...")
+        known_summaries = previous_summaries(stored_vectors) if stored_vectors else None
+        failures = []
+        docs = load_documents(article_id, bundle.folder, software=isSoftware, bundle=bundle,
+                              known_summaries=known_summaries, stream=STREAM_DOCUMENTS, failures=failures)
+
+        if STREAM_DOCUMENTS:
+            # Documents are embedded and upserted while the rest are still being summarized
+            print(f"Streaming documents to vectorstore...")
+            result = sync_docs_to_pinecone(docs, article_id, stored_vectors, software=isSoftware, context=context,
+                                           failures=failures)
+            if not result:
+                print("No documents were loaded. Processing failed.")
+                return False
+        else:
+            if not docs:
+                print("No documents were loaded. Processing failed.")
+                return False
+
+            if stored_vectors is not None:
+                print(f"Updating changed documents in vectorstore...")
+                result = sync_docs_to_pinecone(docs, article_id, stored_vectors, software=isSoftware, context=context,
+                                               failures=failures)
+            else:
+                print(f"Removing existing records for article {article_id} from vectorstore...")
+                if not remove_article_pinecone(article_id, software=isSoftware, context=context):
+                    print("Failed to remove existing records from vectorstore.")
+                    return False
+
+                print(f"Sending new documents to vectorstore...")
+                result = send_docs_to_pinecone(docs, article_id, software=isSoftware, context=context)
+
+        convert_images_to_webp(bundle.images, os.path.join(TARGET_IMAGES_PATH, f"{article_id}"))
+
+        if failures:
+            # Not recorded as synced, so the next incremental run retries the article
+            print(f"Article {article_id} was only partly processed: {'; '.join(failures)}")
             return False
-        
-        print(f"Sending new documents to vectorstore...")
-        result = send_docs_to_pinecone(docs, article_id, software=isSoftware)
-
-        images_path = os.path.join(article_dir_path, "images")
-        convert_images_to_webp(images_path, os.path.join(TARGET_IMAGES_PATH, f"{article_id}"))
-
         if result:
+            if sync_state:
+                sync_state.mark_synced(article_id, context.last_edited_at, context.content_hash)
             print(f"Successfully processed article {article_id}.")
             return True
         else:
@@ -148,12 +209,17 @@ def process_article(article_id, site_id, article_dir_path, debug=False):
         return False
     finally:
         # Clean up temporary files whether successful or not
+        if bundle is not None:
+            bundle.release()
         remove_temp_folder(article_id)
 
 def remove_temp_folder(article_id=None):
     """Remove the temporary folder for an article if it exists."""
     if article_id is None and current_article_id is None:
         return
+    if PERSIST_ARTICLE_FILES:
+        # Kept on purpose so the fetched articles can be inspected
+        return
         
     folder_to_remove = article_id if article_id else current_article_id
     current_dir = os.path.dirname(os.path.abspath(__file__))